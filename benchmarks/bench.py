@@ -0,0 +1,187 @@
+import typing as t
+import dataclasses
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+import typer
+from wled_tools import protocol
+from wled_tools.display import Pixel, VirtualDisplay
+from wled_tools.mapping import Mapping
+
+# Synthetic DDP traffic sized like the dome, and 10 times that.
+DOME_MAPPING: t.Final[str] = "settings/dome.json"
+SCALES: t.Final = (1, 10)
+# The viewer has to keep up with 60 FPS senders at every scale.
+RENDER_FPS_TARGET: t.Final[float] = 60
+
+
+@dataclasses.dataclass
+class Result:
+    name: str
+    pixels: int
+    number: int
+    repeat: int
+    best: float
+    median: float
+
+    @property
+    def per_op_us(self) -> float:
+        return self.best / self.number * 1e6
+
+    def to_dict(self) -> dict:
+        return dataclasses.asdict(self) | {"per_op_us": self.per_op_us}
+
+
+def scaled_mapping(mapping: Mapping, scale: int) -> Mapping:
+    return Mapping(vertices=mapping.vertices, edges=mapping.edges * scale)
+
+
+def frame_bytes(pixels_count: int) -> bytes:
+    return bytes(i % 256 for i in range(pixels_count * 3))
+
+
+def benchmarks(mapping: Mapping) -> dict[str, t.Callable[[], t.Any]]:
+    ddp = protocol.DDP()
+    frame = frame_bytes(mapping.pixels_count)
+    packets = ddp.encode_frame(frame)
+    display = VirtualDisplay(pixels_count=mapping.pixels_count)
+    # Sequence 0 isn't filtered, replaying the same packets every iteration
+    # would otherwise only time the rejection of duplicates.
+    display_packets = ddp.encode_frame(frame, sequence=0)
+
+    def parse_packet():
+        for packet in packets:
+            ddp.parse_packet(packet)
+
+    def parse_view():
+        for packet in packets:
+            ddp.parse_view(packet)
+
+    def feed_frame():
+        for packet in display_packets:
+            display.feed_packet(packet)
+
+    feed_frame()
+    feed_frame()
+    if display.frames_count != 2:
+        raise RuntimeError("display.feed_packet doesn't present a frame per iteration")
+
+    def pixel_positions():
+        # Bypass the per-instance cache.
+        return Mapping.pixel_positions.func(mapping)
+
+    return {
+        "ddp.parse_packet": parse_packet,
+        "ddp.parse_view": parse_view,
+        "ddp.encode_frame": lambda: ddp.encode_frame(frame),
+        "pixel.from_raw": lambda: Pixel.from_raw(frame),
+        "display.feed_packet": feed_frame,
+        "mapping.segments": lambda: list(mapping.segments),
+        "mapping.pixel_positions": pixel_positions,
+    }
+
+
+def render_benchmarks(mapping: Mapping) -> dict[str, t.Callable[[], t.Any]]:
+    # A full frame through `Viewer.update` into a hidden window: dirty range
+    # upload, draw and flip. `glFinish` waits for the GPU so the time isn't
+    # only the command submission.
+    from pyglet import gl
+    from wled_tools.viewer import Viewer
+
+    frame = frame_bytes(mapping.pixels_count)
+    display = VirtualDisplay(pixels_count=mapping.pixels_count)
+    viewer = Viewer(mapping=mapping, display=display, visible=False)
+
+    def update():
+        display.show(frame)
+        viewer.update()
+        gl.glFinish()
+
+    return {"viewer.update": update}
+
+
+def run(mapping: Mapping, *, repeat: int, min_time: float, render: bool = False) -> list[Result]:
+    results = []
+    funcs = benchmarks(mapping)
+    if render:
+        funcs |= render_benchmarks(mapping)
+    for name, func in funcs.items():
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        number = max(number, int(number * min_time / 0.2))
+        times = timer.repeat(repeat=repeat, number=number)
+        results.append(Result(
+            name=name,
+            pixels=mapping.pixels_count,
+            number=number,
+            repeat=repeat,
+            best=min(times),
+            median=statistics.median(times),
+        ))
+    return results
+
+
+def main(
+    output: t.Optional[typer.FileTextWrite] = None,
+    compare: t.Optional[typer.FileText] = None,
+    mapping_file: t.Annotated[typer.FileText, typer.Option()] = DOME_MAPPING,
+    repeat: int = 5,
+    min_time: float = 0.2,
+    render: t.Annotated[bool, typer.Option(
+        help="Also time the viewer rendering, needs pyglet and OpenGL.",
+    )] = True,
+    headless: t.Annotated[bool, typer.Option(
+        help="Render without a display server, through EGL.",
+    )] = False,
+):
+    mapping = Mapping.from_file(mapping_file)
+    if render:
+        try:
+            import pyglet
+            pyglet.options["headless"] = headless
+            import pyglet.window
+        except Exception as e:
+            print(f"Skipping rendering benchmarks: {e}")
+            render = False
+
+    results = [
+        result
+        for scale in SCALES
+        for result in run(
+            scaled_mapping(mapping, scale), repeat=repeat, min_time=min_time, render=render
+        )
+    ]
+
+    previous: dict[tuple[str, int], float] = {}
+    if compare:
+        previous = {
+            (r["name"], r["pixels"]): r["per_op_us"]
+            for r in json.load(compare)["results"]
+        }
+
+    for result in results:
+        line = f"{result.name:<26} {result.pixels:>6} px {result.per_op_us:>12.1f} us"
+        before = previous.get((result.name, result.pixels))
+        if before:
+            line += f" {result.per_op_us / before:>7.2f}x"
+        if result.name == "viewer.update":
+            fps = 1e6 / result.per_op_us
+            line += f" {fps:>7.0f} fps"
+            if fps < RENDER_FPS_TARGET:
+                line += f" (below {RENDER_FPS_TARGET:.0f} fps)"
+        print(line)
+
+    if output:
+        json.dump({
+            "python": sys.version,
+            "platform": platform.platform(),
+            "time": time.time(),
+            "results": [r.to_dict() for r in results],
+        }, output, indent=2)
+
+
+if __name__ == "__main__":
+    typer.run(main)
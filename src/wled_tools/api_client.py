@@ -1,14 +1,44 @@
-from .state import apply_effect_to_segments
+from .state import apply_effect_to_segments, diff_segments
+from . import cache
+from . import ota
+from .catalog import Catalog
 from .preset import Color, Fx, Palette, Colors
+from concurrent.futures import ThreadPoolExecutor
 from rich import print
+from rich.progress import Progress
+from rich.table import Table
+import copy
+import dataclasses
 import json
+import time
 import requests
+import requests.adapters
 import enum
 import typing as t
 import typer
 
 app = typer.Typer()
-wled_url: str
+
+# (connect, read) seconds.
+TIMEOUT: t.Final = (3.05, 10)
+UPDATE_TIMEOUT: t.Final = (3.05, 120)
+
+
+def make_session(pool_maxsize: int = 2) -> requests.Session:
+    # The ESP32 only handles a few connections at once, keep them few and
+    # alive across requests.
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_maxsize,
+        max_retries=requests.adapters.Retry(
+            total=2, backoff_factor=0.2, allowed_methods=["GET"]
+        ),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 
 class Scope(enum.Enum):
     CONFIG = "cfg"
@@ -18,12 +48,216 @@ class Scope(enum.Enum):
     PALETTES = "pal"
     PRESETS = "presets"
 
+
+@dataclasses.dataclass
+class Node:
+    url: str
+    timeout: t.Any = TIMEOUT
+    session: requests.Session = dataclasses.field(default_factory=make_session)
+
+    def __post_init__(self) -> None:
+        self.url = self.url.rstrip("/")
+
+    def api_url(self, scope: t.Optional[Scope]) -> str:
+        url = self.url + "/json/"
+        if scope:
+            url += scope.value.lstrip("/")
+        return url
+
+    def get(self, scope: t.Optional[Scope]) -> t.Any:
+        if scope is Scope.PRESETS:
+            return self.session.get(self.url + "/presets.json", timeout=self.timeout).json()
+        return self.session.get(self.api_url(scope), timeout=self.timeout).json()
+
+    def set(self, scope: t.Optional[Scope], data: dict) -> t.Any:
+        # Anything posted may change the state `effect` diffs against.
+        self.invalidate_cache("state")
+        return self.session.post(
+            self.api_url(scope), json={"v": True} | data, timeout=self.timeout
+        ).json()
+
+    def upload_presets(self, presets: str) -> str:
+        self.invalidate_cache("state")
+        return self.session.post(
+            self.url + "/upload",
+            files={"data": ("/presets.json", presets)},
+            timeout=self.timeout,
+        ).text
+
+    def catalog(self, *, check_version: bool = True) -> Catalog:
+        # Effects and palettes are cached on disk. With `check_version`, only
+        # the small /json/info is fetched and the catalog is downloaded again
+        # if the firmware changed.
+        path = cache.node_cache_path(self.url, "catalog")
+        data = cache.load_json(path)
+        catalog = Catalog.from_dict(data) if data else None
+        if catalog is not None and not check_version:
+            return catalog
+
+        info = self.session.get(self.api_url(Scope.INFO), timeout=self.timeout).json()
+        version = Catalog.version_of(info)
+        if catalog is not None and catalog.version == version:
+            return catalog
+
+        catalog = Catalog(
+            version=version,
+            effects=self.session.get(self.api_url(Scope.EFFECTS), timeout=self.timeout).json(),
+            palettes=self.session.get(self.api_url(Scope.PALETTES), timeout=self.timeout).json(),
+        )
+        cache.save_json(path, catalog.to_dict())
+        return catalog
+
+    def resolve_effect(
+        self, effect: t.Optional[str], palette: t.Optional[str]
+    ) -> tuple[t.Union[Fx, int, None], t.Union[Palette, int, None]]:
+        # Names known to `Fx`/`Palette` don't need the node catalog.
+        fx: t.Union[Fx, int, None] = None
+        pal: t.Union[Palette, int, None] = None
+        if effect:
+            fx = Fx[effect] if effect in Fx.__members__ else self.catalog(check_version=False).effect_id(effect)
+        if palette:
+            pal = Palette[palette] if palette in Palette.__members__ else self.catalog(check_version=False).palette_id(palette)
+        return fx, pal
+
+    def effect(self, *, max_state_age: t.Optional[float] = None, **kwargs: t.Any) -> t.Any:
+        # With `max_state_age`, the node state is cached locally and the
+        # initial GET is skipped while the last GET is younger than that.
+        # Local updates keep the GET time, so changes made on the node
+        # (playlists, buttons) are still picked up.
+        state_path = cache.node_cache_path(self.url, "state")
+        state = None
+        fetched = 0.0
+        if max_state_age is not None:
+            cached = cache.load_json(state_path)
+            if cached and time.time() - cached.get("fetched", 0.0) <= max_state_age:
+                state, fetched = cached["state"], cached["fetched"]
+        if state is None:
+            state = self.session.get(self.api_url(Scope.STATE), timeout=self.timeout).json()
+            fetched = time.time()
+
+        old_segments = copy.deepcopy(state["seg"])
+        new_segments = apply_effect_to_segments(state["seg"], **kwargs)
+        delta = diff_segments(old_segments, new_segments)
+        result: t.Any = {"success": True}
+        if delta:
+            result = self.session.post(
+                self.api_url(Scope.STATE), json={"seg": delta}, timeout=self.timeout
+            ).json()
+
+        if max_state_age is not None:
+            cache.save_json(state_path, {"fetched": fetched, "state": state})
+        return result
+
+    def update(
+        self,
+        firmware: t.Union[bytes, memoryview],
+        *,
+        attempts: int = 3,
+        progress: t.Optional[ota.Progress] = None,
+    ) -> str:
+        # WLED can't resume an upload, one cut by the network is restarted
+        # from the beginning. A node rejecting the image isn't retried.
+        if attempts < 1:
+            raise ValueError("attempts must be at least 1")
+        for attempt in range(1, attempts + 1):
+            upload = ota.MultipartUpload(firmware, progress=progress)
+            try:
+                response = self.session.post(
+                    self.url + "/update",
+                    data=upload,
+                    headers={"Content-Type": upload.content_type},
+                    timeout=UPDATE_TIMEOUT,
+                )
+                response.raise_for_status()
+                break
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == attempts:
+                    raise
+            finally:
+                upload.close()
+
+        self.invalidate_cache()
+        return response.text
+
+    def invalidate_cache(self, *names: str) -> None:
+        for name in names or ("state", "catalog"):
+            cache.node_cache_path(self.url, name).unlink(missing_ok=True)
+
+
+def load_inventory(path: str) -> list[str]:
+    # One node URL per line, blank lines and `#` comments are ignored.
+    with open(path) as f:
+        lines = (line.split("#", 1)[0].strip() for line in f)
+        return [line for line in lines if line]
+
+
+def parse_nodes(url: str) -> list[str]:
+    # `@file` reads an inventory file, otherwise a comma separated list.
+    if url.startswith("@"):
+        return load_inventory(url[1:])
+    return [u for u in url.split(",") if u]
+
+
+@dataclasses.dataclass
+class NodeResult:
+    node: Node
+    result: t.Any = None
+    error: t.Optional[BaseException] = None
+    elapsed: float = 0.0
+
+
+def run_on_nodes(
+    nodes: list[Node],
+    command: t.Callable[[Node], t.Any],
+    *,
+    concurrency: int = 8,
+) -> list[NodeResult]:
+    def run(node: Node) -> NodeResult:
+        start = time.monotonic()
+        try:
+            return NodeResult(node=node, result=command(node), elapsed=time.monotonic() - start)
+        except Exception as e:
+            return NodeResult(node=node, error=e, elapsed=time.monotonic() - start)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(nodes)))) as executor:
+        return list(executor.map(run, nodes))
+
+
+def results_table(results: list[NodeResult]) -> Table:
+    table = Table("Node", "Status", "Time", "Result")
+    for r in results:
+        if r.error is not None:
+            status, result = "[red]error[/red]", f"{type(r.error).__name__}: {r.error}"
+        else:
+            status = "[green]ok[/green]"
+            result = r.result if isinstance(r.result, str) else json.dumps(r.result)
+        if len(result) > 80:
+            result = result[:77] + "..."
+        table.add_row(r.node.url, status, f"{r.elapsed * 1000:.0f}ms", result)
+    return table
+
+
+nodes: list[Node] = []
+api_scope: t.Optional[Scope] = None
+max_concurrency: int = 8
+
+
+def run(command: t.Callable[[Node], t.Any], *, show: bool = True) -> None:
+    if len(nodes) == 1:
+        result = command(nodes[0])
+        if show:
+            print(result)
+        return
+
+    results = run_on_nodes(nodes, command, concurrency=max_concurrency)
+    print(results_table(results))
+    if any(r.error is not None for r in results):
+        raise typer.Exit(code=1)
+
+
 @app.command()
 def get():
-    if api_url.endswith("/presets"):
-        print(requests.get(wled_url + "/presets.json").json())
-    else:
-        print(requests.get(api_url).json())
+    run(lambda node: node.get(api_scope))
 
 @app.command()
 def effect(
@@ -35,59 +269,90 @@ def effect(
     intensity: t.Optional[int] = None,
     brightness: t.Optional[int] = None,
     on: t.Optional[bool] = True,
+    max_state_age: t.Annotated[t.Optional[float], typer.Option(
+        help="Reuse the locally cached state if younger than this many seconds.",
+    )] = None,
 ) -> None:
-    state = requests.get(api_url + "state").json()
-    new_segments = apply_effect_to_segments(
-        state["seg"],
+    kwargs = dict(
         segments=segments,
         color=getattr(Colors, color) if color else None,
-        effect=Fx[effect] if effect else None,
-        palette=Palette[palette] if palette else None,
         speed=speed,
         intensity=intensity,
         brightness=brightness,
         on=on,
     )
-    print(requests.post(api_url + "state", json={"seg": new_segments}).json())
+
+    def command(node: Node) -> t.Any:
+        fx, pal = node.resolve_effect(effect, palette)
+        return node.effect(max_state_age=max_state_age, effect=fx, palette=pal, **kwargs)
+
+    run(command)
+
+@app.command()
+def catalog(
+    refresh: t.Annotated[bool, typer.Option(
+        help="Check the firmware version and download the catalog if it changed.",
+    )] = True,
+) -> None:
+    run(lambda node: node.catalog(check_version=refresh).to_dict())
 
 @app.command()
 def set(
     value: t.Annotated[t.Optional[str], typer.Option()] = None,
     file: t.Annotated[t.Optional[typer.FileText], typer.Option()] = None
 ) -> None:
-    if api_url.endswith("/presets"):
+    if api_scope is Scope.PRESETS:
         assert file
-        print(requests.post(wled_url + "/upload", files={"data": ("/presets.json", file)}).text)
+        presets = file.read()
+        run(lambda node: node.upload_presets(presets))
         return
 
-    try:
-        if value:
-            data = json.loads(value)
-            print(requests.post(api_url, json={"v": True} | data).json())
-        if file:
-            data = json.load(file)
-            print(requests.post(api_url, json={"v": True} | data).json())
-    except Exception as e:
-        breakpoint()
-        pass
+    if value:
+        data = json.loads(value)
+        run(lambda node: node.set(api_scope, data))
+    if file:
+        file_data = json.load(file)
+        run(lambda node: node.set(api_scope, file_data))
 
 @app.command()
 def update(
-    file: typer.FileBinaryRead
+    file: typer.FileBinaryRead,
+    attempts: t.Annotated[int, typer.Option(min=1)] = 3,
 ) -> None:
-    requests.post(wled_url + "/update", files={"update": file})
+    # The image is mapped once and streamed to every node from there.
+    with ota.open_firmware(file) as firmware, Progress() as progress:
+        tasks = {node.url: progress.add_task(node.url, total=len(firmware)) for node in nodes}
+
+        def command(node: Node) -> str:
+            task = tasks[node.url]
+            return node.update(
+                firmware,
+                attempts=attempts,
+                progress=lambda sent, total: progress.update(task, completed=sent, total=total),
+            )
+
+        run(command, show=False)
 
 @app.callback()
-def main(url: str, scope: t.Annotated[t.Optional[Scope], typer.Option()]=None):
-    global wled_url
-    global api_url
+def main(
+    url: t.Annotated[str, typer.Argument(
+        help="Node URL, comma separated URLs, or @file with one URL per line.",
+    )],
+    scope: t.Annotated[t.Optional[Scope], typer.Option()]=None,
+    connect_timeout: float = TIMEOUT[0],
+    read_timeout: float = TIMEOUT[1],
+    concurrency: int = 8,
+):
+    global nodes
+    global api_scope
+    global max_concurrency
 
-    wled_url = url.rstrip("/")
-    url = wled_url + "/json/"
-    if scope:
-        url += scope.value.lstrip("/")
-    api_url = url
+    api_scope = scope
+    max_concurrency = concurrency
+    nodes = [
+        Node(url=node_url, timeout=(connect_timeout, read_timeout))
+        for node_url in parse_nodes(url)
+    ]
 
 if __name__ == "__main__":
     app()
-
@@ -0,0 +1,38 @@
+import typing as t
+import json
+import os
+import pathlib
+import re
+import tempfile
+import time
+
+
+def cache_dir() -> pathlib.Path:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return pathlib.Path(base) / "wled-tools"
+
+
+def node_cache_path(url: str, name: str) -> pathlib.Path:
+    # One directory per node, named after its URL.
+    node = re.sub(r"[^A-Za-z0-9._-]+", "_", url.split("://", 1)[-1]).strip("_")
+    return cache_dir() / node / f"{name}.json"
+
+
+def load_json(path: pathlib.Path, *, max_age: t.Optional[float] = None) -> t.Any:
+    # None if missing, unreadable or older than `max_age` seconds.
+    try:
+        if max_age is not None and time.time() - path.stat().st_mtime > max_age:
+            return None
+        with path.open() as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_json(path: pathlib.Path, data: t.Any) -> None:
+    # Write to a temporary file first so concurrent readers never see a
+    # partial file.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=path.parent, delete=False, suffix=".tmp") as f:
+        json.dump(data, f)
+    os.replace(f.name, path)
@@ -0,0 +1,52 @@
+import dataclasses
+import re
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+@dataclasses.dataclass
+class Catalog:
+    # Effects and palettes names of a node, the index is the WLED id.
+    version: str
+    effects: list[str]
+    palettes: list[str]
+    _effect_ids: dict[str, int] = dataclasses.field(init=False, repr=False)
+    _palette_ids: dict[str, int] = dataclasses.field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._effect_ids = {_normalize(n): i for i, n in reversed(list(enumerate(self.effects)))}
+        self._palette_ids = {_normalize(n): i for i, n in reversed(list(enumerate(self.palettes)))}
+
+    @staticmethod
+    def version_of(info: dict) -> str:
+        # The build id changes with every firmware, even for the same version.
+        return f"{info.get('ver', '')}+{info.get('vid', '')}"
+
+    def effect_id(self, name: str) -> int:
+        try:
+            return self._effect_ids[_normalize(name)]
+        except KeyError:
+            raise KeyError(f"Unknown effect {name!r}") from None
+
+    def palette_id(self, name: str) -> int:
+        try:
+            return self._palette_ids[_normalize(name)]
+        except KeyError:
+            raise KeyError(f"Unknown palette {name!r}") from None
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "effects": self.effects,
+            "palettes": self.palettes,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Catalog":
+        return cls(
+            version=data["version"],
+            effects=data["effects"],
+            palettes=data["palettes"],
+        )
@@ -1,9 +1,15 @@
 import typing as t
+import enum
+import threading
+import time
 import dataclasses
 from . import protocol
+from .metrics import Metrics
 from .utils import grouper
 
 
+BYTES_PER_PIXEL: t.Final[int] = 3
+
 
 @dataclasses.dataclass
 class Pixel:
@@ -22,18 +28,297 @@ class Pixel:
         return pixels
 
 
-class VirtualDisplay:
+@dataclasses.dataclass
+class SequenceStats:
+    # Packets dropped, either duplicates or stale.
+    dropped: int = 0
+    # Packets repeating the previous sequence number.
+    duplicates: int = 0
+    # Packets arriving after a newer one.
+    stale: int = 0
+    # Jumps in the sequence, and how many packets they skipped.
+    gaps: int = 0
+    missing: int = 0
+
+
+class SequenceFilter:
+    # Sequence numbers roll over 1-15, so a packet can't tell a reorder from
+    # a loss. Only packets up to `WINDOW` behind the last accepted one are
+    # stale, anything further is a forward jump over lost packets: a burst
+    # loss mustn't get the packets following it dropped too.
+    WINDOW: t.ClassVar[int] = 3
+
     def __init__(self) -> None:
-        self.framebuffer: list[Pixel] = []
+        self.stats = SequenceStats()
+        self._last: dict[t.Hashable, int] = {}
+
+    def accept(self, source: t.Hashable, sequence: int) -> bool:
+        # Sequence number is ignored if zero.
+        if not sequence:
+            return True
+
+        last = self._last.get(source)
+        self._last[source] = sequence
+        if last is None:
+            return True
+
+        distance = (sequence - last) % 15
+        if distance == 1:
+            return True
+
+        if distance == 0:
+            self.stats.duplicates += 1
+        elif 15 - distance <= self.WINDOW:
+            self.stats.stale += 1
+        else:
+            self.stats.gaps += 1
+            self.stats.missing += distance - 1
+            return True
+
+        self.stats.dropped += 1
+        self._last[source] = last
+        return False
+
+    def reset(self, source: t.Hashable = None) -> None:
+        self._last.pop(source, None)
+
+
+Range = tuple[int, int]
+
+# Past this many disjoint ranges, dirty regions are collapsed into one.
+MAX_DIRTY_RANGES: t.Final[int] = 32
+
+
+def _add_range(ranges: list[Range], start: int, end: int) -> None:
+    for i, (range_start, range_end) in enumerate(ranges):
+        if start <= range_end and range_start <= end:
+            ranges[i] = (min(start, range_start), max(end, range_end))
+            return
+    ranges.append((start, end))
+    if len(ranges) > MAX_DIRTY_RANGES:
+        ranges[:] = [(min(r[0] for r in ranges), max(r[1] for r in ranges))]
+
+
+class VirtualDisplay:
+    def __init__(self, pixels_count: int = 0, push_timeout: t.Optional[float] = 0.1) -> None:
+        # Raw RGB bytes, 3 bytes per pixel. Preallocate with `pixels_count`
+        # so packets never have to grow the buffer.
+        # `framebuffer` always holds a complete frame. Packets are written to
+        # the back buffer which is swapped in when a packet with the push
+        # flag arrives, or for senders that never set it, when a packet
+        # arrives `push_timeout` seconds after the frame started.
+        self.framebuffer = bytearray(pixels_count * BYTES_PER_PIXEL)
+        self.back_buffer = bytearray(pixels_count * BYTES_PER_PIXEL)
+        self.push_timeout = push_timeout
+        self.frames_count = 0
         self.protocol = protocol.DDP()
+        self.sequence_filter = SequenceFilter()
+        self._pending = False
+        # When the first packet of the pending frame was written.
+        self._pending_since = 0.0
+        # Bytes written into the pending frame, then into the last presented
+        # one.
+        self._pending_bytes = 0
+        self.frame_bytes = 0
+        # Byte ranges written to the back buffer, and ranges changed by the
+        # frames presented since the last `take_dirty`.
+        self._back_dirty: list[Range] = []
+        self._dirty: list[Range] = []
+        self._dirty_lock = threading.Lock()
+        # Called with the new framebuffer every time a frame is presented.
+        self.frame_listeners: list[t.Callable[[bytearray], None]] = []
+        self.metrics: t.Optional[Metrics] = None
+
+    @property
+    def pixels_count(self) -> int:
+        return len(self.framebuffer) // BYTES_PER_PIXEL
+
+    @property
+    def pixels(self) -> list[Pixel]:
+        return Pixel.from_raw(self.framebuffer)
+
+    def pixel(self, index: int) -> Pixel:
+        offset = index * BYTES_PER_PIXEL
+        return Pixel(*self.framebuffer[offset:offset + BYTES_PER_PIXEL])
+
+    @property
+    def sequence_stats(self) -> SequenceStats:
+        return self.sequence_filter.stats
+
+    def enable_metrics(self, metrics: Metrics) -> None:
+        self.metrics = metrics
+        stats = self.sequence_filter.stats
+        metrics.gauges["sequence_dropped_packets"] = lambda: stats.dropped
+        metrics.gauges["sequence_duplicate_packets"] = lambda: stats.duplicates
+        metrics.gauges["sequence_stale_packets"] = lambda: stats.stale
+        metrics.gauges["sequence_gaps"] = lambda: stats.gaps
+
+    def feed_packet(self, data: bytes, source: t.Hashable = None) -> None:
+        self.feed_view(self.protocol.parse_view(data), source)
+
+    def feed_view(self, packet: protocol.PacketView, source: t.Hashable = None) -> None:
+        if self.metrics is not None:
+            self.metrics.on_packet(len(packet.data))
+        if not self.sequence_filter.accept(source, packet.sequence):
+            return
+
+        # Without push, a packet past the timeout starts the next frame: the
+        # pending one is presented before this packet is written. The timeout
+        # is only checked when packets arrive, the last frame of a sender
+        # that stops without push is never presented.
+        if (
+            self.push_timeout is not None
+            and self._pending
+            and time.monotonic() - self._pending_since >= self.push_timeout
+        ):
+            self.present()
 
-    def feed_packet(self, data: bytes) -> None:
-        packet = self.protocol.parse_packet(data)
         # Only support WLED DDP format right now.
-        pixels = Pixel.from_raw(packet.data)
-        start = packet.data_offset // 3
-        if len(self.framebuffer) < start:
-            self.framebuffer.extend([Pixel() for _ in range(packet.data_offset)])
+        self.write(packet.data_offset, packet.data[:packet.data_size])
+
+        if packet.flags.push:
+            self.present()
+
+    def write(self, offset: int, data: t.Union[bytes, bytearray, memoryview]) -> None:
+        end = offset + len(data)
+        if len(self.back_buffer) < end:
+            self.back_buffer.extend(bytes(end - len(self.back_buffer)))
+
+        self.back_buffer[offset:end] = data
+        _add_range(self._back_dirty, offset, end)
+        self._pending_bytes += len(data)
+        if not self._pending:
+            self._pending = True
+            self._pending_since = time.monotonic()
+
+    def show(self, frame: t.Union[bytes, bytearray, memoryview]) -> None:
+        self.write(0, frame)
+        self.present()
+
+    def present(self) -> None:
+        if not self._pending:
+            return
+
+        # Rebinding the attribute is atomic, readers either see the previous
+        # or the new frame.
+        self.framebuffer, self.back_buffer = self.back_buffer, self.framebuffer
+        # Senders may only update part of a frame, carry this frame changes
+        # over to the previous one.
+        if len(self.back_buffer) != len(self.framebuffer):
+            self.back_buffer[:] = self.framebuffer
+        else:
+            for start, end in self._back_dirty:
+                self.back_buffer[start:end] = self.framebuffer[start:end]
+
+        with self._dirty_lock:
+            for start, end in self._back_dirty:
+                _add_range(self._dirty, start, end)
+        self._back_dirty = []
+        self.frames_count += 1
+        self._pending = False
+        self.frame_bytes, self._pending_bytes = self._pending_bytes, 0
+        if self.metrics is not None:
+            self.metrics.on_frame(self.frame_bytes)
+        for listener in self.frame_listeners:
+            listener(self.framebuffer)
+
+    def take_dirty(self) -> list[Range]:
+        # Byte ranges of `framebuffer` changed since the previous call.
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, []
+        return dirty
+
+
+class SourceKey(enum.Enum):
+    ADDRESS = "address"
+    TARGET_ID = "target_id"
+    ADDRESS_AND_TARGET_ID = "address_and_target_id"
+
+
+class MultiDisplay:
+    # One VirtualDisplay per sender, keyed by the sender host and/or the DDP
+    # target id. When a `layout` of `(start, length)` pixel ranges is given
+    # (see `Mapping.led_config`), every presented source frame is also copied
+    # into `composite` at its range.
+    def __init__(
+        self,
+        *,
+        key: SourceKey = SourceKey.ADDRESS,
+        layout: t.Optional[dict[t.Hashable, tuple[int, int]]] = None,
+        push_timeout: t.Optional[float] = 0.1,
+    ) -> None:
+        self.key = key
+        self.layout = layout
+        self.push_timeout = push_timeout
+        self.displays: dict[t.Hashable, VirtualDisplay] = {}
+        self.composite: t.Optional[VirtualDisplay] = None
+        if layout is not None:
+            pixels_count = max((start + length for start, length in layout.values()), default=0)
+            self.composite = VirtualDisplay(pixels_count=pixels_count, push_timeout=None)
+        self.protocol = protocol.DDP()
+        self.metrics: t.Optional[Metrics] = None
+
+    def enable_metrics(self, metrics: Metrics) -> None:
+        # Packets and frames of every source are counted together.
+        self.metrics = metrics
+
+    @classmethod
+    def from_led_config(
+        cls,
+        sources: list[t.Hashable],
+        led_config: t.Iterable[tuple[int, int]],
+        **kwargs: t.Any,
+    ) -> "MultiDisplay":
+        return cls(layout=dict(zip(sources, led_config)), **kwargs)
+
+    @property
+    def framebuffer(self) -> bytearray:
+        if self.composite is None:
+            raise ValueError("MultiDisplay has no layout to compose a framebuffer")
+        return self.composite.framebuffer
+
+    def take_dirty(self) -> list[Range]:
+        if self.composite is None:
+            raise ValueError("MultiDisplay has no layout to compose a framebuffer")
+        return self.composite.take_dirty()
+
+    def source_key(self, packet: protocol.PacketView, source: t.Hashable) -> t.Hashable:
+        # Senders use ephemeral ports, only keep the host.
+        host = source[0] if isinstance(source, tuple) else source
+        if self.key is SourceKey.ADDRESS:
+            return host
+        if self.key is SourceKey.TARGET_ID:
+            return int(packet.target_id)
+        return host, int(packet.target_id)
+
+    def feed_packet(self, data: bytes, source: t.Hashable = None) -> None:
+        packet = self.protocol.parse_view(data)
+        key = self.source_key(packet, source)
+        display = self.displays.get(key)
+        if display is None:
+            _, length = (self.layout or {}).get(key, (0, 0))
+            display = VirtualDisplay(pixels_count=length, push_timeout=self.push_timeout)
+            self.displays[key] = display
+
+        frames_count = display.frames_count
+        display.feed_view(packet, source)
+        if self.metrics is not None:
+            self.metrics.on_packet(len(packet.data))
+        if display.frames_count == frames_count:
+            return
+        if self.metrics is not None:
+            self.metrics.on_frame(display.frame_bytes)
+        if self.composite is None:
+            return
+
+        region = self.layout.get(key) if self.layout else None
+        if region is not None:
+            start, length = region
+            self.composite.write(
+                start * BYTES_PER_PIXEL,
+                memoryview(display.framebuffer)[:length * BYTES_PER_PIXEL],
+            )
+            self.composite.present()
+
 
-        end = start + packet.data_size // 3
-        self.framebuffer[start:end] = pixels
+Display = t.Union[VirtualDisplay, MultiDisplay]
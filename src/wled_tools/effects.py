@@ -0,0 +1,150 @@
+import typing as t
+import abc
+import math
+import numpy as np
+import typer
+from .dome import CENTER
+from .mapping import Mapping, Point
+from .palettes import palette_lut
+from .preset import Palette
+from .scheduler import FrameScheduler
+from .sender import DDPSender
+
+
+class PolarLayout:
+    # Per-LED polar coordinates around `center`, the vectorized counterpart
+    # of `PolarCoord.from_vector`. Use the center given to
+    # `SegmentsMapping.from_mapping` (`dome.CENTER`) so phases line up with
+    # the node's segmap. Radius is normalized so the furthest LED is at 1,
+    # theta is in turns (0-1) instead of radians.
+    def __init__(self, mapping: Mapping, center: Point) -> None:
+        positions = np.frombuffer(mapping.pixel_positions, dtype=np.float32).reshape(-1, 2)
+        x = positions[:, 0] - np.float32(center.x)
+        y = positions[:, 1] - np.float32(center.y)
+        radius = np.hypot(x, y)
+        self.radius = (radius / (radius.max() or 1)).astype(np.float32)
+        self.theta = ((np.arctan2(y, x) / math.tau) % 1).astype(np.float32)
+
+        # Skip pixels lead each edge and stay dark.
+        self.visible = np.ones(len(positions), dtype=bool)
+        offset = 0
+        for edge in mapping.edges:
+            self.visible[offset:offset + edge.skip_pixels] = False
+            offset += edge.skip_pixels + edge.pixels_count
+
+    def __len__(self) -> int:
+        return len(self.radius)
+
+
+class Effect(abc.ABC):
+    # Subclasses fill `self.index` (floats, one turn per palette) for time `t`,
+    # the base class maps it to colors through a palette LUT.
+    def __init__(
+        self,
+        layout: PolarLayout,
+        *,
+        lut: t.Optional[np.ndarray] = None,
+        speed: float = 0.25,
+        bands: float = 1.0,
+    ) -> None:
+        self.layout = layout
+        self.lut = palette_lut(Palette.Rainbow) if lut is None else lut
+        # Turns per second.
+        self.speed = speed
+        self.bands = bands
+        self.index = np.empty(len(layout), dtype=np.float32)
+        self._lut_index = np.empty(len(layout), dtype=np.int32)
+        self._dark = ~layout.visible
+
+    @abc.abstractmethod
+    def compute(self, t: float) -> None:
+        ...
+
+    def render(self, t: float, out: np.ndarray) -> np.ndarray:
+        # `out` is a (LEDs, 3) uint8 array.
+        self.compute(t)
+        np.multiply(self.index, 256, out=self.index)
+        # Floored so negative indexes wrap to the right entry, masking wraps
+        # around so the palette repeats past one turn.
+        np.floor(self.index, out=self.index)
+        np.copyto(self._lut_index, self.index, casting="unsafe")
+        np.bitwise_and(self._lut_index, 0xFF, out=self._lut_index)
+        np.take(self.lut, self._lut_index, axis=0, out=out)
+        out[self._dark] = 0
+        return out
+
+
+class Spin(Effect):
+    # Palette laid around the center, rotating.
+    def compute(self, t: float) -> None:
+        np.multiply(self.layout.theta, self.bands, out=self.index)
+        np.add(self.index, (t * self.speed) % 1, out=self.index)
+
+
+class Spiral(Effect):
+    # Like `Spin`, with the phase shifted along the radius.
+    def __init__(self, layout: PolarLayout, *, twist: float = 1.0, **kwargs: t.Any) -> None:
+        super().__init__(layout, **kwargs)
+        self.twist = twist
+        self._phase = (layout.theta * self.bands + layout.radius * twist).astype(np.float32)
+
+    def compute(self, t: float) -> None:
+        np.add(self._phase, (t * self.speed) % 1, out=self.index)
+
+
+class RadialGradient(Effect):
+    # Rings of the palette moving out of the center.
+    def compute(self, t: float) -> None:
+        np.multiply(self.layout.radius, self.bands, out=self.index)
+        np.subtract(self.index, (t * self.speed) % 1, out=self.index)
+
+
+EFFECTS: t.Final[dict[str, type[Effect]]] = {
+    "spin": Spin,
+    "spiral": Spiral,
+    "radial": RadialGradient,
+}
+
+
+class EffectEngine:
+    def __init__(self, effect: Effect) -> None:
+        self.effect = effect
+        self.frame = np.zeros((len(effect.layout), 3), dtype=np.uint8)
+
+    def render(self, t: float) -> memoryview:
+        # The returned view is reused by the next render.
+        self.effect.render(t, self.frame)
+        return memoryview(self.frame).cast("B")
+
+
+def main(
+    mapping_file: typer.FileText,
+    effect: str = "spiral",
+    palette: str = Palette.Rainbow.name,
+    host: str = "127.0.0.1",
+    port: int = 4048,
+    fps: float = 60,
+    speed: float = 0.25,
+    bands: float = 1.0,
+    duration: t.Optional[float] = None,
+    center_x: float = CENTER.x,
+    center_y: float = CENTER.y,
+):
+    mapping = Mapping.from_file(mapping_file)
+    engine = EffectEngine(EFFECTS[effect](
+        PolarLayout(mapping, Point(center_x, center_y)),
+        lut=palette_lut(Palette[palette]),
+        speed=speed,
+        bands=bands,
+    ))
+    scheduler = FrameScheduler(fps)
+    with DDPSender(host=host, port=port) as sender:
+        try:
+            for _, offset in scheduler.ticks(duration):
+                sender.send(engine.render(offset))
+        finally:
+            print(scheduler.stats.summary())
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,183 @@
+import typing as t
+import dataclasses
+import random
+import socket
+import threading
+import time
+import typer
+from . import protocol
+from .metrics import Metrics
+from .scheduler import FrameScheduler
+from .server import DDPServer
+
+
+@dataclasses.dataclass
+class LoadStats:
+    frames: int = 0
+    packets: int = 0
+    bytes: int = 0
+    lost: int = 0
+    duplicated: int = 0
+    reordered: int = 0
+    skipped_frames: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        elapsed = self.elapsed or 1.0
+        return (
+            f"sent {self.frames} frames ({self.frames / elapsed:.1f} fps), "
+            f"{self.packets} packets ({self.packets / elapsed:.0f} pkt/s), "
+            f"{self.bytes / elapsed / 1e6:.2f} MB/s; "
+            f"lost {self.lost}, duplicated {self.duplicated}, reordered {self.reordered}, "
+            f"skipped frames {self.skipped_frames}"
+        )
+
+
+class LoadGenerator:
+    def __init__(
+        self,
+        *,
+        host: str,
+        port: int = protocol.DDP_PORT,
+        pixels_count: int,
+        fps: float = 60,
+        max_payload_size: int = protocol.MAX_PAYLOAD_SIZE,
+        push: bool = True,
+        timecode: bool = False,
+        # Probabilities per packet.
+        duplicate: float = 0.0,
+        reorder: float = 0.0,
+        loss: float = 0.0,
+        seed: t.Optional[int] = None,
+    ) -> None:
+        self.address = (host, port)
+        self.pixels_count = pixels_count
+        self.fps = fps
+        self.max_payload_size = max_payload_size
+        self.push = push
+        self.timecode = timecode
+        self.duplicate = duplicate
+        self.reorder = reorder
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.stats = LoadStats()
+        self.scheduler = FrameScheduler(fps)
+        self.protocol = protocol.DDP()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sequence = 1
+        # Frames are moving windows over a pattern twice the frame size.
+        size = pixels_count * 3
+        self._pattern = memoryview(bytes(i * 7 % 256 for i in range(size * 2)))
+
+    def frame(self, index: int) -> memoryview:
+        size = self.pixels_count * 3
+        offset = index * 3 % size if size else 0
+        return self._pattern[offset:offset + size]
+
+    def _impair(self, packets: list[bytes]) -> list[bytes]:
+        out: list[bytes] = []
+        for packet in packets:
+            if self.loss and self.random.random() < self.loss:
+                self.stats.lost += 1
+                continue
+            out.append(packet)
+            if self.duplicate and self.random.random() < self.duplicate:
+                out.append(packet)
+                self.stats.duplicated += 1
+        for i in range(len(out) - 1):
+            if self.reorder and self.random.random() < self.reorder:
+                out[i], out[i + 1] = out[i + 1], out[i]
+                self.stats.reordered += 1
+        return out
+
+    def send_frame(self, index: int, timestamp: float) -> None:
+        packets = self.protocol.encode_frame(
+            self.frame(index),
+            sequence=self._sequence,
+            max_payload_size=self.max_payload_size,
+            push=self.push,
+            # Timecode is in 1/2^16 seconds.
+            timecode=int(timestamp * 65536) & 0xFFFFFFFF if self.timecode else None,
+        )
+        for _ in packets:
+            self._sequence = protocol.next_sequence(self._sequence)
+
+        for packet in self._impair(packets):
+            self.socket.sendto(packet, self.address)
+            self.stats.packets += 1
+            self.stats.bytes += len(packet)
+        self.stats.frames += 1
+
+    def run(self, duration: float) -> LoadStats:
+        start = time.monotonic()
+        for index, offset in self.scheduler.ticks(duration):
+            self.send_frame(index, offset)
+        self.stats.elapsed = time.monotonic() - start
+        self.stats.skipped_frames = self.scheduler.stats.skipped
+        return self.stats
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+def main(
+    host: str = "127.0.0.1",
+    port: int = protocol.DDP_PORT,
+    leds: int = 2250,
+    fps: float = 60,
+    duration: float = 10,
+    payload_size: int = protocol.MAX_PAYLOAD_SIZE,
+    push: bool = True,
+    timecode: bool = False,
+    duplicate: float = 0.0,
+    reorder: float = 0.0,
+    loss: float = 0.0,
+    seed: t.Optional[int] = None,
+    local: t.Annotated[bool, typer.Option(
+        help="Run a DDPServer in this process and compare its counters.",
+    )] = False,
+):
+    server: t.Optional[DDPServer] = None
+    metrics = Metrics()
+    if local:
+        server = DDPServer(host=host, port=port, pixels_count=leds)
+        server.enable_metrics(metrics)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    generator = LoadGenerator(
+        host=host,
+        port=port,
+        pixels_count=leds,
+        fps=fps,
+        max_payload_size=payload_size,
+        push=push,
+        timecode=timecode,
+        duplicate=duplicate,
+        reorder=reorder,
+        loss=loss,
+        seed=seed,
+    )
+    try:
+        stats = generator.run(duration)
+    finally:
+        generator.close()
+    print(stats.summary())
+    print(generator.scheduler.stats.summary())
+
+    if server is not None:
+        # Let the receiver drain its socket.
+        time.sleep(0.2)
+        server.shutdown()
+        server.server_close()
+        sequence = server.display.sequence_stats
+        print(
+            f"received {metrics.packets}/{stats.packets} packets, "
+            f"{metrics.frames}/{stats.frames} frames; "
+            f"kernel drops {server.dropped_packets}, "
+            f"filtered duplicates {sequence.duplicates}, stale {sequence.stale}, "
+            f"gaps {sequence.gaps}"
+        )
+
+
+if __name__ == "__main__":
+    typer.run(main)
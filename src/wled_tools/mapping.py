@@ -1,8 +1,11 @@
+import array
+import functools
 import math
 import io
 import typing as t
 import json
 import dataclasses
+import numpy as np
 from .utils import grouper
 
 VerticeId = t.NewType("VerticeId", int)
@@ -102,6 +105,27 @@ class Mapping:
                 skip_pixels=edge.skip_pixels,
             )
 
+    @functools.cached_property
+    def pixel_positions(self) -> array.array:
+        # Flat `x0, y0, x1, y1, ...` coordinates of every pixel, skip pixels
+        # included, in strip order. Computed once per mapping.
+        segments = [s for s in self.segments if s.skip_pixels + s.pixels_count]
+        if not segments:
+            return array.array("f")
+        counts = np.array([s.skip_pixels + s.pixels_count for s in segments])
+        starts = np.array([(s.from_.x, s.from_.y) for s in segments])
+        ends = np.array([(s.to.x, s.to.y) for s in segments])
+        divisors = np.array([s.pixels_count or s.skip_pixels for s in segments])
+        steps = (ends - starts) / divisors[:, None]
+        # Index of every pixel within its segment.
+        index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(starts, counts, axis=0) + index[:, None] * np.repeat(steps, counts, axis=0)
+        return array.array("f", positions.astype(np.float32).tobytes())
+
+    @property
+    def pixels_count(self) -> int:
+        return sum(e.pixels_count + e.skip_pixels for e in self.edges)
+
     def led_config(self, output_count: int=1) -> t.Iterable[tuple[int, int]]:
         offset = 0
         for edges in grouper(self.edges, len(self.edges) // output_count):
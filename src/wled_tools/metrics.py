@@ -0,0 +1,200 @@
+import typing as t
+import bisect
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds, from 0.5ms to 1s.
+TIME_BUCKETS: t.Final = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+# Bytes, up to a 10k LEDs RGB frame.
+SIZE_BUCKETS: t.Final = (64, 256, 1024, 1440, 4096, 8192, 16384, 32768)
+
+# How often the packets, frames and draws rates are refreshed.
+RATE_INTERVAL: t.Final[float] = 1.0
+
+
+class Histogram:
+    # Fixed buckets, `counts[i]` holds values up to `buckets[i]` and the last
+    # count holds everything above the last bucket.
+    def __init__(self, buckets: t.Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        # Welford's running variance.
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+
+    @property
+    def mean(self) -> float:
+        return self._mean
+
+    @property
+    def stddev(self) -> float:
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self._m2 / (self.count - 1))
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the `q` quantile.
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+    def to_prometheus(self, name: str) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum {self.sum}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+
+class Metrics:
+    # Components only hold a `metrics` reference when instrumentation is
+    # enabled, so the disabled cost is a single `is not None` check.
+    def __init__(self) -> None:
+        self.packets = 0
+        self.packet_bytes = 0
+        self.frames = 0
+        self.draws = 0
+        self.frame_bytes = Histogram(SIZE_BUCKETS)
+        self.frame_interval = Histogram(TIME_BUCKETS)
+        self.latency = Histogram(TIME_BUCKETS)
+        # Values owned by other components, read when reporting.
+        self.gauges: dict[str, t.Callable[[], t.Optional[float]]] = {}
+        self.packets_per_second = 0.0
+        self.frames_per_second = 0.0
+        self.draws_per_second = 0.0
+
+        self._frame_start: t.Optional[float] = None
+        self._last_frame: t.Optional[float] = None
+        # When the last presented frame first packet arrived.
+        self._last_frame_start: t.Optional[float] = None
+        self._drawn_frame_start: t.Optional[float] = None
+        self._rate_sample = (time.monotonic(), 0, 0, 0)
+
+    def on_packet(self, size: int) -> None:
+        self.packets += 1
+        self.packet_bytes += size
+        if self._frame_start is None:
+            self._frame_start = time.monotonic()
+
+    def on_frame(self, size: int) -> None:
+        now = time.monotonic()
+        self.frames += 1
+        self.frame_bytes.observe(size)
+        if self._last_frame is not None:
+            self.frame_interval.observe(now - self._last_frame)
+        self._last_frame = now
+        self._last_frame_start = self._frame_start if self._frame_start is not None else now
+        self._frame_start = None
+
+    def on_draw(self) -> None:
+        self.draws += 1
+        frame_start = self._last_frame_start
+        # Only measure a frame latency the first time it is drawn.
+        if frame_start is not None and frame_start != self._drawn_frame_start:
+            self.latency.observe(time.monotonic() - frame_start)
+            self._drawn_frame_start = frame_start
+
+    def update_rates(self) -> None:
+        now = time.monotonic()
+        last, packets, frames, draws = self._rate_sample
+        elapsed = now - last
+        if elapsed < RATE_INTERVAL:
+            return
+        self.packets_per_second = (self.packets - packets) / elapsed
+        self.frames_per_second = (self.frames - frames) / elapsed
+        self.draws_per_second = (self.draws - draws) / elapsed
+        self._rate_sample = (now, self.packets, self.frames, self.draws)
+
+    def summary(self) -> str:
+        self.update_rates()
+        return (
+            f"{self.packets_per_second:.0f} pkt/s, {self.frames_per_second:.1f} fps, "
+            f"{self.draws_per_second:.1f} draws/s, {self.frame_bytes.mean:.0f} B/frame, "
+            f"latency p50 {self.latency.quantile(0.5) * 1000:g}ms "
+            f"p99 {self.latency.quantile(0.99) * 1000:g}ms, "
+            f"jitter {self.frame_interval.stddev * 1000:.2f}ms"
+        )
+
+    def to_prometheus(self, prefix: str = "wled_ddp") -> str:
+        lines = [
+            f"# TYPE {prefix}_packets_total counter",
+            f"{prefix}_packets_total {self.packets}",
+            f"# TYPE {prefix}_packet_bytes_total counter",
+            f"{prefix}_packet_bytes_total {self.packet_bytes}",
+            f"# TYPE {prefix}_frames_total counter",
+            f"{prefix}_frames_total {self.frames}",
+            f"# TYPE {prefix}_draws_total counter",
+            f"{prefix}_draws_total {self.draws}",
+        ]
+        for name, histogram in [
+            ("frame_bytes", self.frame_bytes),
+            ("frame_interval_seconds", self.frame_interval),
+            ("latency_seconds", self.latency),
+        ]:
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            lines.extend(histogram.to_prometheus(f"{prefix}_{name}"))
+        for name, gauge in self.gauges.items():
+            value = gauge()
+            if value is not None:
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsReporter:
+    # Logs a summary line and optionally rewrites a Prometheus text file
+    # every `interval` seconds.
+    def __init__(
+        self,
+        metrics: Metrics,
+        *,
+        interval: float = 10.0,
+        prometheus_path: t.Optional[str] = None,
+    ) -> None:
+        self.metrics = metrics
+        self.interval = interval
+        self.prometheus_path = prometheus_path
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "MetricsReporter":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def report(self) -> None:
+        logger.info(self.metrics.summary())
+        if self.prometheus_path:
+            with open(self.prometheus_path, "w") as f:
+                f.write(self.metrics.to_prometheus())
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.report()
@@ -0,0 +1,94 @@
+import typing as t
+import contextlib
+import mmap
+import uuid
+
+CHUNK_SIZE: t.Final[int] = 16 * 1024
+
+Progress = t.Callable[[int, int], None]
+
+
+class MultipartUpload:
+    # A multipart/form-data body holding a single file, streamed from
+    # `data` in chunks. It has a length so requests sends a Content-Length
+    # instead of a chunked body, which WLED doesn't accept.
+    def __init__(
+        self,
+        data: t.Union[bytes, memoryview],
+        *,
+        field: str = "update",
+        filename: str = "firmware.bin",
+        progress: t.Optional[Progress] = None,
+    ) -> None:
+        self.boundary = uuid.uuid4().hex
+        head = (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self._parts = [memoryview(head), memoryview(data), memoryview(tail)]
+        self.total = sum(len(p) for p in self._parts)
+        self.sent = 0
+        self.progress = progress
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return self.total - self.sent
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            size = self.total
+        chunks = []
+        position = self.sent
+        for part in self._parts:
+            if position >= len(part):
+                position -= len(part)
+                continue
+            chunk = part[position:position + size]
+            chunks.append(chunk)
+            size -= len(chunk)
+            position = 0
+            if not size:
+                break
+
+        data = b"".join(chunks)
+        self.sent += len(data)
+        if self.progress is not None and data:
+            self.progress(self.sent, self.total)
+        return data
+
+    def close(self) -> None:
+        # Release the views so the firmware mapping can be closed.
+        for part in self._parts:
+            part.release()
+        self._parts = []
+
+    def __iter__(self) -> t.Iterator[bytes]:
+        while True:
+            chunk = self.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+@contextlib.contextmanager
+def open_firmware(file: t.BinaryIO) -> t.Iterator[t.Union[bytes, memoryview]]:
+    # Map the image once, every upload streams from the same pages instead
+    # of holding a copy each.
+    try:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Pipes and empty files can't be mapped.
+        yield file.read()
+        return
+
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        view.release()
+        mapped.close()
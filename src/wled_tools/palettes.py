@@ -0,0 +1,158 @@
+import typing as t
+import functools
+import numpy as np
+from .preset import Color, Palette
+
+# (position, r, g, b) stops, in WLED's `palettes.h` gradient format.
+Gradient = tuple[tuple[int, int, int, int], ...]
+
+# FastLED 16 colors palettes, evenly spaced and wrapping around.
+_PALETTES_16: t.Final[dict[Palette, tuple[int, ...]]] = {
+    Palette.Cloud: (
+        0x0000FF, 0x00008B, 0x00008B, 0x00008B, 0x00008B, 0x00008B, 0x00008B, 0x00008B,
+        0x0000FF, 0x00008B, 0x87CEEB, 0x87CEEB, 0xADD8E6, 0xFFFFFF, 0xADD8E6, 0x87CEEB,
+    ),
+    Palette.Lava: (
+        0x000000, 0x800000, 0x000000, 0x800000, 0x8B0000, 0x8B0000, 0x800000, 0x8B0000,
+        0x8B0000, 0x8B0000, 0xFF0000, 0xFFA500, 0xFFFFFF, 0xFFA500, 0xFF0000, 0x8B0000,
+    ),
+    Palette.Rainbow: (
+        0xFF0000, 0xD52A00, 0xAB5500, 0xAB7F00, 0xABAB00, 0x56D500, 0x00FF00, 0x00D52A,
+        0x00AB55, 0x0056AA, 0x0000FF, 0x2A00D5, 0x5500AB, 0x7F0081, 0xAB0055, 0xD5002B,
+    ),
+    Palette.RainbowBand: (
+        0xFF0000, 0x000000, 0xAB5500, 0x000000, 0xABAB00, 0x000000, 0x00FF00, 0x000000,
+        0x00AB55, 0x000000, 0x0000FF, 0x000000, 0x5500AB, 0x000000, 0xAB0055, 0x000000,
+    ),
+}
+
+# Gradient palettes, named after their WLED id.
+_GRADIENTS: t.Final[dict[Palette, Gradient]] = {
+    # Sunset_Real_gp
+    Palette.Sunset: (
+        (0, 120, 0, 0), (22, 179, 22, 0), (51, 255, 104, 0), (85, 167, 22, 18),
+        (135, 100, 0, 103), (198, 16, 0, 130), (255, 0, 0, 160),
+    ),
+    # rgi_15_gp
+    Palette.RedBlue: (
+        (0, 4, 1, 31), (31, 55, 1, 16), (63, 197, 3, 7), (95, 59, 2, 17),
+        (127, 6, 2, 34), (159, 39, 6, 33), (191, 112, 13, 32), (223, 56, 9, 35),
+        (255, 22, 6, 38),
+    ),
+    # Analogous_1_gp
+    Palette.Analogus: (
+        (0, 3, 0, 255), (63, 23, 0, 255), (127, 67, 0, 255), (191, 142, 0, 45),
+        (255, 255, 0, 0),
+    ),
+    # es_pinksplash_08_gp
+    Palette.Splash: (
+        (0, 126, 11, 255), (127, 197, 1, 22), (175, 210, 157, 172), (221, 157, 3, 112),
+        (255, 157, 3, 112),
+    ),
+    # es_vintage_01_gp
+    Palette.Vintage: (
+        (0, 4, 1, 1), (51, 16, 0, 1), (76, 97, 104, 3), (101, 255, 131, 19),
+        (127, 67, 9, 4), (153, 16, 0, 1), (229, 4, 1, 1), (255, 4, 1, 1),
+    ),
+    # gr65_hult_gp
+    Palette.Hult: (
+        (0, 247, 176, 247), (48, 255, 136, 255), (89, 220, 29, 226), (160, 7, 82, 178),
+        (216, 1, 124, 109), (255, 1, 124, 109),
+    ),
+    # lava_gp
+    Palette.Fire: (
+        (0, 0, 0, 0), (46, 18, 0, 0), (96, 113, 0, 0), (108, 142, 3, 1),
+        (119, 175, 17, 1), (146, 213, 44, 2), (174, 255, 82, 4), (188, 255, 115, 4),
+        (202, 255, 156, 4), (218, 255, 203, 4), (234, 255, 255, 4), (244, 255, 255, 71),
+        (255, 255, 255, 255),
+    ),
+    # Colorfull_gp, "Cyane" in WLED.
+    Palette.Party: (
+        (0, 10, 85, 5), (25, 29, 109, 18), (60, 59, 138, 42), (93, 83, 99, 52),
+        (106, 110, 66, 64), (109, 123, 49, 65), (113, 139, 35, 66), (116, 192, 117, 98),
+        (124, 255, 255, 137), (168, 100, 180, 155), (255, 22, 121, 174),
+    ),
+    # Pink_Purple_gp
+    Palette.LightPink: (
+        (0, 19, 2, 39), (25, 26, 4, 45), (51, 33, 6, 52), (76, 68, 62, 125),
+        (102, 118, 187, 240), (109, 163, 215, 247), (114, 217, 244, 255),
+        (122, 159, 149, 221), (149, 113, 78, 188), (183, 128, 57, 155),
+        (255, 146, 40, 123),
+    ),
+    # Tiamat_gp
+    Palette.Tiamat: (
+        (0, 1, 2, 14), (33, 2, 5, 35), (100, 13, 135, 92), (120, 43, 255, 193),
+        (140, 247, 7, 249), (160, 193, 17, 208), (180, 39, 255, 154), (200, 4, 213, 236),
+        (220, 39, 252, 135), (240, 193, 213, 253), (255, 255, 249, 255),
+    ),
+    # Orangery_gp
+    Palette.Orangery: (
+        (0, 255, 95, 23), (30, 255, 82, 0), (60, 223, 13, 8), (90, 144, 44, 2),
+        (120, 255, 110, 17), (150, 255, 69, 0), (180, 158, 13, 11), (210, 241, 82, 17),
+        (255, 213, 37, 4),
+    ),
+    # toxy_reaf_gp
+    Palette.ToxyReaf: (
+        (0, 1, 221, 53), (255, 73, 3, 178),
+    ),
+    # fairy_reaf_gp
+    Palette.FairyReaf: (
+        (0, 184, 1, 128), (160, 1, 193, 182), (219, 153, 227, 190), (255, 255, 255, 255),
+    ),
+    # pink_candy_gp
+    Palette.PinkCandy: (
+        (0, 255, 255, 255), (45, 7, 12, 255), (112, 227, 1, 127), (140, 255, 255, 255),
+        (155, 227, 1, 127), (196, 45, 1, 99), (255, 255, 255, 255),
+    ),
+    # red_reaf_gp
+    Palette.RedReaf: (
+        (0, 3, 13, 43), (104, 78, 141, 240), (188, 255, 0, 0), (255, 28, 1, 1),
+    ),
+}
+
+
+def gradient_lut(gradient: Gradient) -> np.ndarray:
+    stops = np.array(gradient, dtype=np.float32)
+    index = np.arange(256, dtype=np.float32)
+    channels = [np.interp(index, stops[:, 0], stops[:, c]) for c in (1, 2, 3)]
+    return np.rint(np.stack(channels, axis=1)).astype(np.uint8)
+
+
+def palette16_lut(colors: t.Sequence[int]) -> np.ndarray:
+    # Linear blend between entries, the last one blends back into the first.
+    gradient = tuple(
+        (i * 256 // len(colors), (c >> 16) & 0xFF, (c >> 8) & 0xFF, c & 0xFF)
+        for i, c in enumerate(tuple(colors) + (colors[0],))
+    )
+    return gradient_lut(gradient)
+
+
+def solid_lut(color: Color) -> np.ndarray:
+    return np.tile(np.array(color.to_list(), dtype=np.uint8), (256, 1))
+
+
+@functools.lru_cache(maxsize=None)
+def _palette_lut(palette: Palette) -> np.ndarray:
+    if palette in _PALETTES_16:
+        lut = palette16_lut(_PALETTES_16[palette])
+    else:
+        lut = gradient_lut(_GRADIENTS[palette])
+    lut.flags.writeable = False
+    return lut
+
+
+def palette_lut(palette: Palette, colors: t.Sequence[Color] = ()) -> np.ndarray:
+    # (256, 3) uint8 lookup table. `Palette.Solid` is WLED's "Color 1", the
+    # segment primary color.
+    if palette is Palette.Solid:
+        return solid_lut(colors[0] if colors else Color(255, 255, 255))
+    return _palette_lut(palette)
+
+
+def colorize(lut: np.ndarray, index: np.ndarray, out: t.Optional[np.ndarray] = None) -> np.ndarray:
+    # Floats are in turns of the palette and wrap around (floored, so negative
+    # turns land on the right entry), integers are used as LUT indexes modulo
+    # 256.
+    if index.dtype.kind == "f":
+        index = np.floor(index * 256).astype(np.int64)
+    return np.take(lut, index & 0xFF, axis=0, out=out)
@@ -0,0 +1,340 @@
+import typing as t
+import bisect
+import dataclasses
+import itertools
+import json
+import threading
+import time
+import numpy as np
+import typer
+from .display import VirtualDisplay
+from .dome import CENTER
+from .effects import PolarLayout
+from .mapping import Mapping, Point
+from .palettes import colorize, palette_lut
+from .preset import Color, Fx, Palette, Preset
+from .recording import Compression, FrameRecorder
+from .scheduler import FrameScheduler
+
+# Seconds a preset plays for when no duration is given.
+DEFAULT_DURATION: t.Final[float] = 180.0
+
+
+@dataclasses.dataclass
+class SegmentContext:
+    # Everything a kernel needs to render one segment, arrays are per LED.
+    position: np.ndarray
+    radius: np.ndarray
+    theta: np.ndarray
+    lut: np.ndarray
+    colors: list[Color]
+    speed: int
+    intensity: int
+    rng: np.random.Generator
+
+    @property
+    def rate(self) -> float:
+        # Palette turns per second, roughly how fast WLED effects move.
+        return 0.05 + self.speed / 255 * 1.5
+
+    @property
+    def color(self) -> np.ndarray:
+        color = self.colors[0] if self.colors else Color(255, 255, 255)
+        return np.array(color.to_list(), dtype=np.float32)
+
+
+Kernel = t.Callable[[float, SegmentContext], np.ndarray]
+
+
+def static(t: float, ctx: SegmentContext) -> np.ndarray:
+    return np.broadcast_to(ctx.color, (len(ctx.position), 3))
+
+
+def breath(t: float, ctx: SegmentContext) -> np.ndarray:
+    level = 0.55 + 0.45 * np.sin(t * ctx.rate * np.pi * 2)
+    return np.broadcast_to(ctx.color * level, (len(ctx.position), 3))
+
+
+def scroll(t: float, ctx: SegmentContext) -> np.ndarray:
+    # Palette moving along the segment.
+    bands = 1 + ctx.intensity / 64
+    return colorize(ctx.lut, ctx.position * bands - t * ctx.rate)
+
+
+def chase(t: float, ctx: SegmentContext) -> np.ndarray:
+    colors = colorize(ctx.lut, ctx.position - t * ctx.rate * 0.2).astype(np.float32)
+    phase = (ctx.position * (4 + ctx.intensity / 16) - t * ctx.rate) % 1
+    return colors * (phase < 0.5)[:, None]
+
+
+def circle_spin(t: float, ctx: SegmentContext) -> np.ndarray:
+    return colorize(ctx.lut, ctx.theta * (1 + ctx.intensity // 64) + t * ctx.rate)
+
+
+def spiral_spin(t: float, ctx: SegmentContext) -> np.ndarray:
+    twist = 0.5 + ctx.intensity / 64
+    return colorize(ctx.lut, ctx.theta + ctx.radius * twist + t * ctx.rate)
+
+
+def radial(t: float, ctx: SegmentContext) -> np.ndarray:
+    return colorize(ctx.lut, ctx.radius * (1 + ctx.intensity / 64) - t * ctx.rate)
+
+
+def fire(t: float, ctx: SegmentContext) -> np.ndarray:
+    # Flickering heat, hotter at the start of the segment.
+    heat = (1 - ctx.position) * 0.6 + ctx.rng.random(len(ctx.position)) * 0.4
+    return colorize(ctx.lut, np.clip(heat, 0, 0.99))
+
+
+def sparkle(t: float, ctx: SegmentContext) -> np.ndarray:
+    # Random LEDs lit from the palette, density follows intensity.
+    lit = ctx.rng.random(len(ctx.position)) < 0.02 + ctx.intensity / 255 * 0.3
+    colors = colorize(ctx.lut, ctx.rng.random(len(ctx.position))).astype(np.float32)
+    return colors * lit[:, None]
+
+
+def noise(t: float, ctx: SegmentContext) -> np.ndarray:
+    # Smooth blobs drifting over the palette.
+    wave = np.sin(ctx.position * 7 + t * ctx.rate * 3) + np.sin(ctx.theta * 11 - t * ctx.rate * 2)
+    return colorize(ctx.lut, wave * 0.25 + 0.5)
+
+
+KERNELS: t.Final[dict[Fx, Kernel]] = {
+    Fx.Static: static,
+    Fx.Breath: breath,
+    Fx.DisolveRandom: sparkle,
+    Fx.MultiStrobe: sparkle,
+    Fx.RainbowRunner: scroll,
+    Fx.Chase2: chase,
+    Fx.FireFlicker: fire,
+    Fx.Firework1D: sparkle,
+    Fx.Rain: sparkle,
+    Fx.ScannerDual: chase,
+    Fx.Fire2012: fire,
+    Fx.ColorTwinkle: sparkle,
+    Fx.MeteorSmooth: chase,
+    Fx.FireworkExploding: sparkle,
+    Fx.DancingShadow: chase,
+    Fx.Blend: scroll,
+    Fx.CircleSpin: circle_spin,
+    Fx.SpiralSpin: spiral_spin,
+    Fx.PixelWave: radial,
+    Fx.Juggles: chase,
+    Fx.MatriPix: sparkle,
+    Fx.Plasmoid: noise,
+    Fx.Puddles: sparkle,
+    Fx.MidNoise: noise,
+    Fx.TwoDGEQ: radial,
+    Fx.NoiseFire: fire,
+    Fx.GravCenter: radial,
+    Fx.GravCentric: radial,
+    Fx.AudioComet: chase,
+}
+
+
+@dataclasses.dataclass
+class _Layer:
+    indices: np.ndarray
+    kernel: Kernel
+    context: SegmentContext
+    brightness: float
+
+
+class PresetRenderer:
+    # Approximates a preset's effects on the host. Works from WLED preset
+    # JSON (`Preset.to_dict()` or a `presets.json` entry) so presets saved
+    # on a node render the same way.
+    def __init__(
+        self,
+        mapping: Mapping,
+        preset: t.Union[Preset, dict],
+        *,
+        layout: t.Optional[PolarLayout] = None,
+        center: Point = CENTER,
+        seed: int = 0,
+    ) -> None:
+        self.layout = layout or PolarLayout(mapping, center)
+        self.frame = np.zeros((len(self.layout), 3), dtype=np.uint8)
+        self.rng = np.random.default_rng(seed)
+        data = preset.to_dict() if isinstance(preset, Preset) else preset
+        self.name = data.get("n", "")
+        self.layers = [
+            layer for segment in data.get("seg", [])
+            if (layer := self._layer(segment)) is not None
+        ]
+
+    def _layer(self, segment: dict) -> t.Optional[_Layer]:
+        start = segment.get("start", 0)
+        stop = min(segment.get("stop", 0), len(self.layout))
+        if stop <= start or not segment.get("on", True):
+            return None
+
+        indices = np.arange(start, stop)
+        if segment.get("rev"):
+            indices = indices[::-1]
+        colors = [Color(*c[:3]) for c in segment.get("col", []) if c]
+        try:
+            palette = Palette(segment.get("pal"))
+        except ValueError:
+            palette = Palette.Rainbow
+        try:
+            kernel = KERNELS[Fx(segment.get("fx"))]
+        except (KeyError, ValueError):
+            kernel = scroll
+
+        return _Layer(
+            indices=indices,
+            kernel=kernel,
+            brightness=segment.get("bri", 255) / 255,
+            context=SegmentContext(
+                position=np.linspace(0, 1, len(indices), endpoint=False, dtype=np.float32),
+                radius=self.layout.radius[indices],
+                theta=self.layout.theta[indices],
+                lut=palette_lut(palette, colors),
+                colors=colors,
+                speed=segment.get("sx", 128),
+                intensity=segment.get("ix", 128),
+                rng=self.rng,
+            ),
+        )
+
+    def render(self, t: float) -> memoryview:
+        # The returned view is reused by the next render.
+        self.frame[:] = 0
+        for layer in self.layers:
+            colors = layer.kernel(t, layer.context)
+            if layer.brightness != 1:
+                colors = colors * layer.brightness
+            self.frame[layer.indices] = colors
+        self.frame[~self.layout.visible] = 0
+        return memoryview(self.frame).cast("B")
+
+
+def load_presets(path: str) -> dict[str, dict]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def find_preset(presets: dict[str, dict], key: str) -> dict:
+    # By id, or by name with or without WLED's `NN.` prefix.
+    if key in presets:
+        return presets[key]
+    for preset in presets.values():
+        name = preset.get("n", "")
+        if key in (name, name.split(".", 1)[-1]):
+            return preset
+    raise KeyError(f"Unknown preset {key!r}")
+
+
+def playlist_entries(presets: dict[str, dict], playlist: dict) -> list[tuple[dict, float]]:
+    entries = playlist["playlist"]
+    ids = entries["ps"]
+    # WLED durations are in tenths of a second, a single number applies to
+    # every entry.
+    durations = entries.get("dur", [])
+    if not isinstance(durations, list):
+        durations = [durations] * len(ids)
+    return [
+        (presets[str(ps)], durations[i] / 10 if i < len(durations) else DEFAULT_DURATION)
+        for i, ps in enumerate(ids)
+    ]
+
+
+class PlaylistRenderer:
+    # Every preset in turn for its duration, each starting from its own
+    # time 0.
+    def __init__(
+        self,
+        mapping: Mapping,
+        entries: list[tuple[dict, float]],
+        *,
+        center: Point = CENTER,
+    ) -> None:
+        self.mapping = mapping
+        self.layout = PolarLayout(mapping, center)
+        self.entries = entries
+        self.starts = list(itertools.accumulate((d for _, d in entries), initial=0.0))
+        self._current: tuple[int, t.Optional[PresetRenderer]] = (-1, None)
+
+    @property
+    def duration(self) -> float:
+        return self.starts[-1]
+
+    def render(self, t: float) -> memoryview:
+        index = min(bisect.bisect_right(self.starts, t) - 1, len(self.entries) - 1)
+        current, renderer = self._current
+        if current != index or renderer is None:
+            renderer = PresetRenderer(self.mapping, self.entries[index][0], layout=self.layout)
+            self._current = (index, renderer)
+        return renderer.render(t - self.starts[index])
+
+
+def render_frames(
+    mapping: Mapping,
+    entries: list[tuple[dict, float]],
+    *,
+    fps: float,
+) -> t.Iterator[tuple[float, memoryview]]:
+    # Timestamped frames of every preset in turn, as fast as they render.
+    playlist = PlaylistRenderer(mapping, entries)
+    for i in range(int(playlist.duration * fps)):
+        yield i / fps, playlist.render(i / fps)
+
+
+def main(
+    mapping_file: typer.FileText,
+    presets_file: str = "settings/presets.json",
+    preset: t.Annotated[t.Optional[str], typer.Option(
+        help="Preset or playlist id or name.",
+    )] = None,
+    duration: t.Annotated[t.Optional[float], typer.Option(
+        help="Seconds per preset, defaults to the playlist durations.",
+    )] = None,
+    fps: float = 30,
+    output: t.Annotated[t.Optional[str], typer.Option(
+        help="Write frames to a recording instead of opening the viewer.",
+    )] = None,
+):
+    mapping = Mapping.from_file(mapping_file)
+    presets = load_presets(presets_file)
+    selected = find_preset(presets, preset) if preset else next(p for p in presets.values() if p)
+    if "playlist" in selected:
+        entries = playlist_entries(presets, selected)
+    else:
+        entries = [(selected, DEFAULT_DURATION)]
+    if duration is not None:
+        entries = [(p, duration) for p, _ in entries]
+
+    if output:
+        start = time.monotonic()
+        with FrameRecorder.open(
+            output,
+            pixels_count=mapping.pixels_count,
+            mapping=mapping,
+            compression=Compression.DELTA,
+        ) as recorder:
+            for timestamp, frame in render_frames(mapping, entries, fps=fps):
+                recorder.write_frame(frame, timestamp)
+        elapsed = time.monotonic() - start
+        total = sum(d for _, d in entries)
+        print(f"Rendered {total:.0f}s of presets in {elapsed:.1f}s ({total / elapsed:.0f}x real time)")
+        return
+
+    from .viewer import Viewer
+
+    display = VirtualDisplay(pixels_count=mapping.pixels_count)
+    viewer = Viewer(mapping=mapping, display=display)
+
+    def play():
+        # Only the frames that are due get rendered, late ones are skipped.
+        playlist = PlaylistRenderer(mapping, entries)
+        scheduler = FrameScheduler(fps)
+        for _, offset in scheduler.ticks(playlist.duration):
+            display.show(playlist.render(offset))
+
+    threading.Thread(target=play, daemon=True).start()
+    viewer.run()
+
+
+if __name__ == "__main__":
+    typer.run(main)
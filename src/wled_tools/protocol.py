@@ -9,7 +9,7 @@ class DDPError(Exception):
     pass
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True)
 class Flags:
     # 2-bits for protocol version number, this module implement version 1 (01).
     version: int
@@ -60,7 +60,7 @@ _size_map: t.Final[dict[int, int]] = {
 }
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True)
 class DataType:
     # C is 0 for standard types or 1 for Customer defined
     custom: bool
@@ -112,59 +112,187 @@ class Packet:
     data: bytes
 
 
+# Same fields as `Packet`, but `data` is a view into the received datagram
+# instead of a copy.
+class PacketView(t.NamedTuple):
+    flags: Flags
+    sequence: int
+    data_type: t.Optional[DataType]
+    target_id: t.Union[int, TargetId]
+    data_offset: int
+    data_size: int
+    timecode: t.Optional[int]
+    data: memoryview
+
+
+DDP_PORT: t.Final[int] = 4048
+HEADER_SIZE: t.Final[int] = 10
+TIMECODE_SIZE: t.Final[int] = 4
+# 480 RGB pixels, the largest payload WLED sends and accepts.
+MAX_PAYLOAD_SIZE: t.Final[int] = 1440
+
+FLAG_VERSION_1: t.Final[int] = 0b01000000
+FLAG_TIMECODE: t.Final[int] = 0b00010000
+FLAG_PUSH: t.Final[int] = 0b00000001
+# Standard RGB type, 8 bits per element.
+DATA_TYPE_RGB8: t.Final[int] = (ColorType.RGB << 3) | 3
+
+_header_struct: t.Final = struct.Struct(">BBBBIH")
+_timecode_struct: t.Final = struct.Struct(">I")
+
+
+def _parse_flags(byte: int) -> Flags:
+    return Flags(
+        version=(byte >> 6) & 0b11,
+        reserved=bool((byte >> 5) & 1),
+        timecode=bool((byte >> 4) & 1),
+        storage=bool((byte >> 3) & 1),
+        reply=bool((byte >> 2) & 1),
+        query=bool((byte >> 1) & 1),
+        push=bool(byte & 1),
+    )
+
+
+def _parse_data_type(byte: int) -> t.Optional[DataType]:
+    if not byte:
+        return None
+    return DataType(
+        custom=bool((byte >> 7) & 1),
+        reserved=bool((byte >> 6) & 1),
+        color_type=ColorType((byte >> 3) & 0b111),
+        bits=_size_map[byte & 0b111],
+    )
+
+
+def _parse_target_id(byte: int) -> t.Union[int, TargetId]:
+    try:
+        return TargetId(byte)
+    except ValueError:
+        return byte
+
+
+# Every header byte decodes to one of 256 values, build them once.
+_flags_table: t.Final = tuple(_parse_flags(b) for b in range(256))
+_data_type_table: t.Final = tuple(_parse_data_type(b) for b in range(256))
+_target_id_table: t.Final = tuple(_parse_target_id(b) for b in range(256))
+
+
+def next_sequence(sequence: int) -> int:
+    # Roll over 1-15, zero means the sequence number is not used.
+    if not sequence:
+        return 0
+    return sequence % 15 + 1
+
+
 class DDP:
     def __init__(self) -> None:
         pass
 
-    def parse_packet(self, packet: bytes) -> Packet:
-        if len(packet) < 10:
+    def encode_header_into(
+        self,
+        buffer: bytearray,
+        *,
+        sequence: int,
+        data_offset: int,
+        data_size: int,
+        push: bool = False,
+        timecode: t.Optional[int] = None,
+        target_id: t.Union[int, TargetId] = TargetId.DEFAULT,
+        data_type: int = DATA_TYPE_RGB8,
+    ) -> int:
+        flags = FLAG_VERSION_1
+        if push:
+            flags |= FLAG_PUSH
+        if timecode is not None:
+            flags |= FLAG_TIMECODE
+
+        _header_struct.pack_into(
+            buffer, 0, flags, sequence & 0xF, data_type, target_id, data_offset, data_size
+        )
+        if timecode is None:
+            return HEADER_SIZE
+
+        _timecode_struct.pack_into(buffer, HEADER_SIZE, timecode)
+        return HEADER_SIZE + TIMECODE_SIZE
+
+    def encode_frame(
+        self,
+        framebuffer: t.Union[bytes, bytearray, memoryview],
+        *,
+        sequence: int = 1,
+        target_id: t.Union[int, TargetId] = TargetId.DEFAULT,
+        max_payload_size: int = MAX_PAYLOAD_SIZE,
+        timecode: t.Optional[int] = None,
+        push: bool = True,
+    ) -> list[bytes]:
+        if max_payload_size <= 0 or max_payload_size % 3:
+            raise DDPError("Payload size must be a positive multiple of 3")
+
+        frame = memoryview(framebuffer)
+        packets: list[bytes] = []
+        header = bytearray(HEADER_SIZE + TIMECODE_SIZE)
+        offset = 0
+        while True:
+            size = min(max_payload_size, len(frame) - offset)
+            last = offset + size >= len(frame)
+            header_size = self.encode_header_into(
+                header,
+                sequence=sequence,
+                data_offset=offset,
+                data_size=size,
+                push=push and last,
+                # Timecode only matters along with the push flag.
+                timecode=timecode if last else None,
+                target_id=target_id,
+            )
+            packets.append(bytes(header[:header_size]) + frame[offset:offset + size])
+            sequence = next_sequence(sequence)
+            offset += size
+            if last:
+                return packets
+
+    def parse_view(self, packet: t.Union[bytes, bytearray, memoryview]) -> PacketView:
+        if len(packet) < HEADER_SIZE:
             raise DDPError("Expected header")
 
-        flags = self.parse_flags(packet[0])
-        sequence = packet[1] & 0xF
-        data_type = self.parse_data_type(packet[2])
-        try:
-            target_id = TargetId(packet[3])
-        except ValueError:
-            target_id = packet[3]
-
-        offset, size = struct.unpack(">IH", packet[4:10])
+        flags_byte, sequence, data_type, target_id, offset, size = _header_struct.unpack_from(packet)
+        flags = _flags_table[flags_byte]
 
         timecode: t.Optional[int] = None
+        data_start = HEADER_SIZE
         if flags.timecode:
-            if len(packet) < 14:
+            if len(packet) < HEADER_SIZE + TIMECODE_SIZE:
                 raise DDPError("Expected timecode")
 
-            (timecode,) = struct.unpack(">I", packet[10:14])
+            (timecode,) = _timecode_struct.unpack_from(packet, HEADER_SIZE)
+            data_start += TIMECODE_SIZE
 
-        return Packet(
+        return PacketView(
             flags=flags,
-            sequence=sequence,
-            data_type=data_type,
-            target_id=target_id,
+            sequence=sequence & 0xF,
+            data_type=_data_type_table[data_type],
+            target_id=_target_id_table[target_id],
             data_offset=offset,
             data_size=size,
             timecode=timecode,
-            data=packet[14:] if flags.timecode else packet[10:],
+            data=memoryview(packet)[data_start:],
         )
 
-    def parse_flags(self, byte: int) -> Flags:
-        return Flags(
-            version=(byte >> 6) & 0b11,
-            reserved=bool((byte >> 5) & 1),
-            timecode=bool((byte >> 4) & 1),
-            storage=bool((byte >> 3) & 1),
-            reply=bool((byte >> 2) & 1),
-            query=bool((byte >> 1) & 1),
-            push=bool(byte & 1),
+    def parse_packet(self, packet: bytes) -> Packet:
+        view = self.parse_view(packet)
+        return Packet(
+            flags=view.flags,
+            sequence=view.sequence,
+            data_type=view.data_type,
+            target_id=view.target_id,
+            data_offset=view.data_offset,
+            data_size=view.data_size,
+            timecode=view.timecode,
+            data=view.data.tobytes(),
         )
 
+    def parse_flags(self, byte: int) -> Flags:
+        return _flags_table[byte]
+
     def parse_data_type(self, byte: int) -> t.Optional[DataType]:
-        if not byte:
-            return None
-        return DataType(
-            custom=bool((byte >> 7) & 1),
-            reserved=bool((byte >> 6) & 1),
-            color_type=ColorType((byte >> 3) & 0b111),
-            bits=_size_map[byte & 0b111],
-        )
+        return _data_type_table[byte]
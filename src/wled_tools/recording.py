@@ -0,0 +1,288 @@
+import typing as t
+import array
+import bisect
+import enum
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+from .mapping import Mapping
+from .scheduler import FrameScheduler, ScheduleStats
+from .sender import DDPSender
+import typer
+
+# File layout:
+#   header: magic, version, pixels count, start time (unix), mapping size
+#   mapping: `Mapping.to_dict()` as JSON, empty if unknown
+#   frames: (time offset, encoding, size) followed by `size` payload bytes
+MAGIC: t.Final[bytes] = b"WLEDFRMS"
+VERSION: t.Final[int] = 1
+
+_file_header: t.Final = struct.Struct(">8sHIdI")
+_frame_header: t.Final = struct.Struct(">dBI")
+
+
+class RecordingError(Exception):
+    pass
+
+
+class Compression(enum.Enum):
+    NONE = "none"
+    ZLIB = "zlib"
+    # XOR with the previous frame, then zlib. Static areas compress to
+    # almost nothing.
+    DELTA = "delta"
+
+
+class Encoding(enum.IntEnum):
+    RAW = 0
+    ZLIB = 1
+    DELTA_ZLIB = 2
+
+
+def xor_bytes(a: bytes, b: bytes) -> bytes:
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+
+class FrameRecorder:
+    def __init__(
+        self,
+        file: t.BinaryIO,
+        *,
+        pixels_count: int,
+        mapping: t.Optional[Mapping] = None,
+        compression: Compression = Compression.NONE,
+        # Delta frames need the previous frame, a full frame is written every
+        # `keyframe_interval` frames so a reader can start from there.
+        keyframe_interval: int = 60,
+        compression_level: int = 1,
+    ) -> None:
+        self.file = file
+        self.compression = compression
+        self.keyframe_interval = keyframe_interval
+        self.compression_level = compression_level
+        self.frames_count = 0
+        self.start_time = time.time()
+        self._start = time.monotonic()
+        self._previous: t.Optional[bytes] = None
+
+        mapping_data = json.dumps(mapping.to_dict()).encode() if mapping else b""
+        self.file.write(_file_header.pack(
+            MAGIC, VERSION, pixels_count, self.start_time, len(mapping_data)
+        ))
+        self.file.write(mapping_data)
+
+    @classmethod
+    def open(cls, path: str, **kwargs: t.Any) -> "FrameRecorder":
+        return cls(open(path, "wb"), **kwargs)
+
+    def encode(self, frame: bytes) -> tuple[Encoding, bytes]:
+        if self.compression is Compression.NONE:
+            return Encoding.RAW, frame
+
+        previous = self._previous
+        self._previous = frame
+        if (
+            self.compression is Compression.DELTA
+            and previous is not None
+            and len(previous) == len(frame)
+            and self.frames_count % self.keyframe_interval
+        ):
+            return Encoding.DELTA_ZLIB, zlib.compress(xor_bytes(frame, previous), self.compression_level)
+        return Encoding.ZLIB, zlib.compress(frame, self.compression_level)
+
+    def write_frame(self, frame: t.Union[bytes, bytearray, memoryview], timestamp: t.Optional[float] = None) -> None:
+        if timestamp is None:
+            timestamp = time.monotonic() - self._start
+        encoding, payload = self.encode(bytes(frame))
+        self.file.write(_frame_header.pack(timestamp, encoding, len(payload)))
+        self.file.write(payload)
+        self.frames_count += 1
+
+    def __call__(self, frame: bytearray) -> None:
+        self.write_frame(frame)
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "FrameRecorder":
+        return self
+
+    def __exit__(self, *args: t.Any) -> None:
+        self.close()
+
+
+Frame = t.Union[bytes, memoryview]
+
+
+class FrameReader:
+    # Memory-maps a recording. The frame index is built on first use by
+    # walking the frame headers. Raw frames are returned as views into the
+    # file, compressed frames are decoded.
+    def __init__(self, file: t.BinaryIO) -> None:
+        self.file = file
+        # mmap refuses empty files, check before mapping.
+        if os.fstat(file.fileno()).st_size < _file_header.size:
+            raise RecordingError("Expected header")
+        self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self._mmap)
+
+        magic, version, self.pixels_count, self.start_time, mapping_size = _file_header.unpack_from(self.data)
+        if magic != MAGIC:
+            raise RecordingError("Not a frame recording")
+        if version != VERSION:
+            raise RecordingError(f"Unsupported recording version {version}")
+
+        mapping_data = self.data[_file_header.size:_file_header.size + mapping_size]
+        self.mapping = Mapping.from_dict(json.loads(bytes(mapping_data))) if mapping_size else None
+        self._frames_start = _file_header.size + mapping_size
+        self._timestamps: t.Optional[array.array] = None
+        self._offsets = array.array("Q")
+        self._encodings = bytearray()
+        self._last_frame: tuple[int, Frame] = (-1, b"")
+
+    @classmethod
+    def open(cls, path: str) -> "FrameReader":
+        file = open(path, "rb")
+        try:
+            return cls(file)
+        except BaseException:
+            file.close()
+            raise
+
+    @property
+    def timestamps(self) -> array.array:
+        if self._timestamps is None:
+            self._build_index()
+        assert self._timestamps is not None
+        return self._timestamps
+
+    def _build_index(self) -> None:
+        timestamps = array.array("d")
+        offset = self._frames_start
+        end = len(self.data)
+        while offset + _frame_header.size <= end:
+            timestamp, encoding, size = _frame_header.unpack_from(self.data, offset)
+            # A recording cut short may end with a partial frame.
+            if offset + _frame_header.size + size > end:
+                break
+            timestamps.append(timestamp)
+            self._offsets.append(offset)
+            self._encodings.append(encoding)
+            offset += _frame_header.size + size
+        self._timestamps = timestamps
+
+    @property
+    def duration(self) -> float:
+        return self.timestamps[-1] if self.timestamps else 0.0
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def find(self, timestamp: float) -> int:
+        # Index of the frame shown at `timestamp`.
+        return max(bisect.bisect_right(self.timestamps, timestamp) - 1, 0)
+
+    def _payload(self, index: int) -> memoryview:
+        offset = self._offsets[index]
+        _, _, size = _frame_header.unpack_from(self.data, offset)
+        start = offset + _frame_header.size
+        return self.data[start:start + size]
+
+    def frame(self, index: int) -> Frame:
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+
+        encoding = self._encodings[index]
+        if encoding == Encoding.RAW:
+            return self._payload(index)
+        if encoding == Encoding.ZLIB:
+            return zlib.decompress(self._payload(index))
+        if encoding != Encoding.DELTA_ZLIB:
+            raise RecordingError(f"Unknown frame encoding {encoding}")
+
+        # Decode forward from the last keyframe, or from the previously
+        # decoded frame when reading sequentially.
+        last_index, last_frame = self._last_frame
+        if last_index < index and all(
+            self._encodings[i] == Encoding.DELTA_ZLIB for i in range(last_index + 1, index + 1)
+        ):
+            start, frame = last_index + 1, bytes(last_frame)
+        else:
+            keyframe = index
+            while self._encodings[keyframe] == Encoding.DELTA_ZLIB:
+                keyframe -= 1
+                if keyframe < 0:
+                    raise RecordingError("Delta frame without a keyframe")
+            start, frame = keyframe + 1, bytes(self.frame(keyframe))
+
+        for i in range(start, index + 1):
+            frame = xor_bytes(zlib.decompress(self._payload(i)), frame)
+        self._last_frame = (index, frame)
+        return frame
+
+    def frame_at(self, timestamp: float) -> Frame:
+        return self.frame(self.find(timestamp))
+
+    def __iter__(self) -> t.Iterator[tuple[float, Frame]]:
+        for i, timestamp in enumerate(self.timestamps):
+            yield timestamp, self.frame(i)
+
+    def play(
+        self,
+        output: t.Callable[[Frame], t.Any],
+        *,
+        speed: float = 1.0,
+        start: float = 0.0,
+        scheduler: t.Optional[FrameScheduler] = None,
+    ) -> ScheduleStats:
+        # Calls `output` with every frame at the recorded pace divided by
+        # `speed`, or as fast as possible if `speed` is 0. Frames the output
+        # can't keep up with are skipped.
+        scheduler = scheduler or FrameScheduler()
+        first = self.find(start)
+        if first >= len(self):
+            return scheduler.stats
+
+        scheduler.reset()
+        origin = self.timestamps[first]
+        for i in range(first, len(self)):
+            if speed and not scheduler.wait((self.timestamps[i] - origin) / speed):
+                continue
+            output(self.frame(i))
+        return scheduler.stats
+
+    def close(self) -> None:
+        # Raw frames are views into the map, it can't be closed while one is
+        # still alive. It's then left to be unmapped when the last view goes.
+        self._last_frame = (-1, b"")
+        self.data.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+    def __enter__(self) -> "FrameReader":
+        return self
+
+    def __exit__(self, *args: t.Any) -> None:
+        self.close()
+
+
+def main(
+    path: str,
+    host: str = "127.0.0.1",
+    port: int = 4048,
+    speed: float = 1.0,
+    start: float = 0.0,
+):
+    with FrameReader.open(path) as reader, DDPSender(host=host, port=port) as sender:
+        stats = reader.play(sender.send, speed=speed, start=start)
+    print(stats.summary())
+
+
+if __name__ == "__main__":
+    typer.run(main)
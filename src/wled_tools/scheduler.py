@@ -0,0 +1,90 @@
+import typing as t
+import time
+from .metrics import Histogram
+
+# The last part of a wait is spun, `time.sleep` can overshoot by the OS timer
+# slack or a scheduler tick.
+SPIN_TIME: t.Final[float] = 0.001
+# Seconds, from 10us to 50ms.
+JITTER_BUCKETS: t.Final = (
+    0.00001, 0.00005, 0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05,
+)
+
+
+class ScheduleStats:
+    def __init__(self) -> None:
+        self.frames = 0
+        self.skipped = 0
+        self.max_jitter = 0.0
+        # How late frames are released after their deadline.
+        self.jitter = Histogram(JITTER_BUCKETS)
+
+    def observe(self, lateness: float) -> None:
+        self.frames += 1
+        self.jitter.observe(lateness)
+        if lateness > self.max_jitter:
+            self.max_jitter = lateness
+
+    def summary(self) -> str:
+        return (
+            f"frames {self.frames}, skipped {self.skipped}; "
+            f"jitter mean {self.jitter.mean * 1e6:.0f}us "
+            f"stddev {self.jitter.stddev * 1e6:.0f}us "
+            f"p99 <={self.jitter.quantile(0.99) * 1e6:.0f}us "
+            f"max {self.max_jitter * 1e6:.0f}us"
+        )
+
+
+class FrameScheduler:
+    # Paces frames on an absolute monotonic timeline: a frame's deadline is
+    # `start + offset`, so a late frame doesn't push back the following ones
+    # and the error doesn't accumulate. A frame later than `max_lateness` is
+    # skipped so the producer catches up instead of sending a backlog.
+    def __init__(
+        self,
+        fps: float = 60,
+        *,
+        spin: float = SPIN_TIME,
+        max_lateness: t.Optional[float] = None,
+    ) -> None:
+        self.interval = 1 / fps
+        self.spin = spin
+        self.max_lateness = self.interval if max_lateness is None else max_lateness
+        self.stats = ScheduleStats()
+        self.start = time.monotonic()
+
+    def reset(self) -> None:
+        self.start = time.monotonic()
+
+    def wait(self, offset: float) -> bool:
+        # Waits until `offset` seconds after `start`. False if that deadline
+        # is already too far behind and the frame should be skipped.
+        deadline = self.start + offset
+        remaining = deadline - time.monotonic()
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+        now = time.monotonic()
+        while now < deadline:
+            now = time.monotonic()
+
+        lateness = now - deadline
+        if lateness > self.max_lateness:
+            self.stats.skipped += 1
+            return False
+        self.stats.observe(lateness)
+        return True
+
+    def ticks(self, duration: t.Optional[float] = None) -> t.Iterator[tuple[int, float]]:
+        # (frame index, offset) at the scheduler rate, skipped frames are
+        # jumped over.
+        self.reset()
+        index = 0
+        while duration is None or index * self.interval < duration:
+            offset = index * self.interval
+            if self.wait(offset):
+                yield index, offset
+                index += 1
+            else:
+                behind = int((time.monotonic() - self.start) / self.interval)
+                self.stats.skipped += max(0, behind - index - 1)
+                index = max(index + 1, behind)
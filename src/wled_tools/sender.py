@@ -0,0 +1,76 @@
+import typing as t
+import socket
+from . import protocol
+
+
+class DDPSender:
+    def __init__(
+        self,
+        *,
+        host: str,
+        port: int = protocol.DDP_PORT,
+        target_id: t.Union[int, protocol.TargetId] = protocol.TargetId.DEFAULT,
+        max_payload_size: int = protocol.MAX_PAYLOAD_SIZE,
+    ) -> None:
+        if max_payload_size <= 0 or max_payload_size % 3:
+            raise protocol.DDPError("Payload size must be a positive multiple of 3")
+
+        self.address = (host, port)
+        self.target_id = target_id
+        self.max_payload_size = max_payload_size
+        self.sequence = 1
+        self.protocol = protocol.DDP()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Packet buffers are allocated once and reused for every frame.
+        self._buffers: list[bytearray] = []
+
+    def _buffer(self, index: int) -> bytearray:
+        if index == len(self._buffers):
+            self._buffers.append(bytearray(
+                protocol.HEADER_SIZE + protocol.TIMECODE_SIZE + self.max_payload_size
+            ))
+        return self._buffers[index]
+
+    def send(
+        self,
+        framebuffer: t.Union[bytes, bytearray, memoryview],
+        *,
+        timecode: t.Optional[int] = None,
+    ) -> int:
+        frame = memoryview(framebuffer)
+        packets: list[memoryview] = []
+        offset = 0
+        while True:
+            size = min(self.max_payload_size, len(frame) - offset)
+            push = offset + size >= len(frame)
+            buffer = self._buffer(len(packets))
+            header_size = self.protocol.encode_header_into(
+                buffer,
+                sequence=self.sequence,
+                data_offset=offset,
+                data_size=size,
+                push=push,
+                timecode=timecode if push else None,
+                target_id=self.target_id,
+            )
+            buffer[header_size:header_size + size] = frame[offset:offset + size]
+            packets.append(memoryview(buffer)[:header_size + size])
+            self.sequence = protocol.next_sequence(self.sequence)
+            offset += size
+            if push:
+                break
+
+        # The frame is fully encoded before the first packet goes out so
+        # the sends are back-to-back.
+        for packet in packets:
+            self.socket.sendto(packet, self.address)
+        return len(packets)
+
+    def close(self) -> None:
+        self.socket.close()
+
+    def __enter__(self) -> "DDPSender":
+        return self
+
+    def __exit__(self, *args: t.Any) -> None:
+        self.close()
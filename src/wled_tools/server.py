@@ -1,6 +1,16 @@
 import typing as t
-from . import display
+import asyncio
+import logging
+import socket
+import struct
+import sys
+from . import protocol
+from .display import Display, VirtualDisplay
+from .mapping import Mapping
+from .metrics import Metrics, MetricsReporter
+from .recording import Compression, FrameRecorder
 import socketserver
+import typer
 
 
 class DDPHandler(socketserver.BaseRequestHandler):
@@ -10,20 +20,227 @@ class DDPHandler(socketserver.BaseRequestHandler):
         try:
             # self.request is the TCP socket connected to the client
             data = self.request[0]
-            self.server.display.feed_packet(data)
+            self.server.display.feed_packet(data, self.client_address)
         except (Exception, KeyboardInterrupt):
             raise
         except BaseException as e:
             raise KeyboardInterrupt from e
 
 
+# Linux only, the kernel attaches the socket's dropped packets count to
+# received datagrams.
+SO_RXQ_OVFL: t.Final[int] = getattr(socket, "SO_RXQ_OVFL", 40)
+_drops_struct: t.Final = struct.Struct("=I")
+
+
 class DDPServer(socketserver.UDPServer):
-    def __init__(self, *, host: str, port: int):
+    def __init__(
+        self,
+        *,
+        host: str,
+        port: int,
+        pixels_count: int = 0,
+        batch_size: int = 64,
+        rcvbuf_size: t.Optional[int] = None,
+        display: t.Optional[Display] = None,
+    ):
+        # Up to `batch_size` datagrams are read each time the socket is
+        # readable, 1 falls back to one `DDPHandler` per datagram.
+        self.batch_size = batch_size
+        self.rcvbuf_size = rcvbuf_size
+        # Datagrams dropped by the kernel because the receive buffer was
+        # full, None if the platform can't report it.
+        self.dropped_packets: t.Optional[int] = None
         super().__init__((host, port), DDPHandler)
-        self.display = display.VirtualDisplay()
+        if display is None:
+            display = VirtualDisplay(pixels_count=pixels_count)
+        self.display = display
+        self.metrics: t.Optional[Metrics] = None
+        self._buffer = bytearray(self.max_packet_size)
+        self._ancbufsize = 0
+        if sys.platform == "linux":
+            try:
+                self.socket.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+            except OSError:
+                pass
+            else:
+                self._ancbufsize = socket.CMSG_SPACE(_drops_struct.size)
+                self.dropped_packets = 0
+
+    def enable_metrics(self, metrics: Metrics) -> None:
+        self.metrics = metrics
+        metrics.gauges["kernel_dropped_packets"] = lambda: self.dropped_packets
+        self.display.enable_metrics(metrics)
+
+    def server_bind(self) -> None:
+        if self.rcvbuf_size:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf_size)
+        super().server_bind()
+
+    def _handle_request_noblock(self) -> None:
+        if self.batch_size <= 1 or not hasattr(self.socket, "recvmsg_into"):
+            return super()._handle_request_noblock()
+
+        # The display copies the payload out, so a single buffer is reused
+        # for every datagram.
+        buffer = memoryview(self._buffer)
+        for _ in range(self.batch_size):
+            try:
+                size, ancdata, _, address = self.socket.recvmsg_into(
+                    [buffer], self._ancbufsize, socket.MSG_DONTWAIT
+                )
+            except OSError:
+                return
+
+            for level, type_, data in ancdata:
+                if level == socket.SOL_SOCKET and type_ == SO_RXQ_OVFL:
+                    (self.dropped_packets,) = _drops_struct.unpack_from(data)
+
+            try:
+                self.display.feed_packet(buffer[:size], address)
+            except Exception:
+                self.handle_error(bytes(buffer[:size]), address)
+
+
+class DDPProtocol(asyncio.DatagramProtocol):
+    def __init__(self, display: Display) -> None:
+        self.display = display
+        # Short or non-DDP datagrams, dropped.
+        self.invalid_packets = 0
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        try:
+            self.display.feed_packet(data, addr)
+        except protocol.DDPError:
+            self.invalid_packets += 1
+
+
+class AsyncDDPServer:
+    # Serves any number of displays, one per UDP endpoint, from a single
+    # event loop.
+    def __init__(self) -> None:
+        self.displays: dict[tuple[str, int], Display] = {}
+        self._transports: list[asyncio.DatagramTransport] = []
+        self._protocols: list[DDPProtocol] = []
+        self._loop: t.Optional[asyncio.AbstractEventLoop] = None
+        self._closed: t.Optional[asyncio.Event] = None
+        # The event is created by `serve_forever` on the running loop, this
+        # remembers a `close` that came first.
+        self._closing = False
+
+    async def add_endpoint(
+        self,
+        *,
+        host: str,
+        port: int,
+        display: t.Optional[Display] = None,
+        pixels_count: int = 0,
+    ) -> Display:
+        if display is None:
+            display = VirtualDisplay(pixels_count=pixels_count)
+
+        loop = self._loop = asyncio.get_running_loop()
+        transport, ddp_protocol = await loop.create_datagram_endpoint(
+            lambda: DDPProtocol(display),
+            local_addr=(host, port),
+        )
+        self._transports.append(transport)
+        self._protocols.append(ddp_protocol)
+        self.displays[transport.get_extra_info("sockname")[:2]] = display
+        return display
+
+    @property
+    def invalid_packets(self) -> int:
+        return sum(p.invalid_packets for p in self._protocols)
+
+    async def serve_forever(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        if self._closed is None:
+            self._closed = asyncio.Event()
+        if self._closing:
+            return
+        await self._closed.wait()
+
+    def close(self) -> None:
+        # Can be called from any thread, transports and the event are only
+        # touched on the server's loop.
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is not loop:
+                loop.call_soon_threadsafe(self.close)
+                return
+
+        for transport in self._transports:
+            transport.close()
+        self._transports.clear()
+        self._closing = True
+        if self._closed is not None:
+            self._closed.set()
+
+    async def __aenter__(self) -> "AsyncDDPServer":
+        return self
+
+    async def __aexit__(self, *args: t.Any) -> None:
+        self.close()
+
+
+def run_async(main: t.Coroutine[t.Any, t.Any, t.Any], *, use_uvloop: bool = True) -> t.Any:
+    if use_uvloop:
+        try:
+            import uvloop
+        except ImportError:
+            pass
+        else:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return asyncio.run(main)
+
+
+def main(
+    host: str = "0.0.0.0",
+    port: int = 4048,
+    record: t.Optional[str] = None,
+    mapping_file: t.Optional[typer.FileText] = None,
+    pixels_count: int = 0,
+    compression: Compression = Compression.DELTA,
+    metrics_interval: t.Optional[float] = None,
+    prometheus_file: t.Optional[str] = None,
+):
+    mapping = Mapping.from_file(mapping_file) if mapping_file else None
+    if mapping and not pixels_count:
+        pixels_count = mapping.pixels_count
+
+    with DDPServer(host=host, port=port, pixels_count=pixels_count) as server:
+        recorder: t.Optional[FrameRecorder] = None
+        if record:
+            recorder = FrameRecorder.open(
+                record,
+                pixels_count=pixels_count,
+                mapping=mapping,
+                compression=compression,
+            )
+            server.display.frame_listeners.append(recorder)
+        reporter: t.Optional[MetricsReporter] = None
+        if metrics_interval:
+            logging.basicConfig(level=logging.INFO)
+            metrics = Metrics()
+            server.enable_metrics(metrics)
+            reporter = MetricsReporter(
+                metrics,
+                interval=metrics_interval,
+                prometheus_path=prometheus_file,
+            ).start()
+        try:
+            server.serve_forever()
+        finally:
+            if reporter:
+                reporter.stop()
+            if recorder:
+                recorder.close()
 
 
 if __name__ == "__main__":
-    HOST, PORT = "0.0.0.0", 4048
-    with DDPServer(host=HOST, port=PORT) as server:
-        server.serve_forever()
+    typer.run(main)
@@ -7,8 +7,8 @@ def apply_effect_to_segments(
     *,
     segments: t.Optional[list[int]],
     color: t.Optional[Color],
-    effect: t.Optional[Fx],
-    palette: t.Optional[Palette],
+    effect: t.Union[Fx, int, None],
+    palette: t.Union[Palette, int, None],
     speed: t.Optional[int],
     intensity: t.Optional[int],
     brightness: t.Optional[int],
@@ -21,10 +21,10 @@ def apply_effect_to_segments(
     for segment in sel_segments:
         if color:
             segment["col"][0:1] = [color.to_list()]
-        if effect:
-            segment["fx"] = effect.value
-        if palette:
-            segment["pal"] = palette.value
+        if effect is not None:
+            segment["fx"] = effect.value if isinstance(effect, Fx) else effect
+        if palette is not None:
+            segment["pal"] = palette.value if isinstance(palette, Palette) else palette
         if speed is not None:
             segment["sx"] = speed
         if intensity is not None:
@@ -33,3 +33,14 @@ def apply_effect_to_segments(
             segment["bri"] = brightness
         segment["on"] = on
     return segments_state
+
+
+def diff_segments(old_segments: list[dict], new_segments: list[dict]) -> list[dict]:
+    # Only the changed fields of changed segments, WLED applies a segment
+    # update by `id` and leaves missing fields untouched.
+    diff = []
+    for i, (old, new) in enumerate(zip(old_segments, new_segments)):
+        changed = {key: value for key, value in new.items() if old.get(key) != value}
+        if changed:
+            diff.append({"id": new.get("id", i)} | changed)
+    return diff
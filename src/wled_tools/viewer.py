@@ -1,65 +1,229 @@
 from typing_extensions import Annotated
+import ctypes
+import logging
+import typing as t
 import typer
 import threading
 from .server import DDPServer
 import pyglet
-from pyglet import shapes
+from pyglet import gl
+from pyglet.graphics.shader import Shader, ShaderProgram
 from .mapping import Mapping
-from .display import VirtualDisplay
+from .display import Display, MultiDisplay, SourceKey, VirtualDisplay
+from .metrics import Metrics, MetricsReporter
+from .recording import FrameReader
+
+
+_vertex_source = """#version 150 core
+in vec2 position;
+in vec3 colors;
+out vec4 vertex_colors;
+
+uniform WindowBlock {
+    mat4 projection;
+    mat4 view;
+} window;
+
+void main() {
+    gl_Position = window.projection * window.view * vec4(position, 0.0, 1.0);
+    vertex_colors = vec4(colors, 1.0);
+}
+"""
+
+_fragment_source = """#version 150 core
+in vec4 vertex_colors;
+out vec4 final_colors;
+
+void main() {
+    final_colors = vertex_colors;
+}
+"""
 
 
 class Viewer:
     def __init__(
         self,
         mapping: Mapping,
-        display: VirtualDisplay,
+        display: Display,
+        point_size: float = 2,
+        metrics: t.Optional[Metrics] = None,
+        visible: bool = True,
     ) -> None:
-        self.window = pyglet.window.Window(800, 800)
+        self.window = pyglet.window.Window(800, 800, visible=visible)
         self.batch = pyglet.graphics.Batch()
         self.display = display
-        self.pixels = []
-
-        for segment in mapping.segments:
-            start = segment.from_
-            end = segment.to
-            for i in range(segment.skip_pixels + segment.pixels_count):
-                rate = i / segment.pixels_count
-                dx = rate * (end.x - start.x)
-                dy = rate * (end.y - start.y)
-                px = start.x + dx
-                py = start.y + dy
-
-                pixel = shapes.Circle(
-                    px, py, radius=1, color=(255, 0, 0), batch=self.batch
-                )
-                self.pixels.append(pixel)
+        self.metrics = metrics
+        self.overlay: t.Optional[pyglet.text.Label] = None
+        if metrics is not None:
+            self.overlay = pyglet.text.Label(
+                "", x=5, y=5, font_size=9, color=(255, 255, 255, 200), batch=self.batch
+            )
+
+        # All LEDs are a single vertex list of points. Colors are RGB bytes,
+        # the same layout as the framebuffer, so a frame is uploaded with one
+        # buffer write.
+        self.program = ShaderProgram(
+            Shader(_vertex_source, "vertex"),
+            Shader(_fragment_source, "fragment"),
+        )
+        positions = mapping.pixel_positions
+        self.pixels_count = len(positions) // 2
+        self.pixels = self.program.vertex_list(
+            self.pixels_count,
+            gl.GL_POINTS,
+            batch=self.batch,
+            position=("f", positions),
+            colors=("Bn", (255, 0, 0) * self.pixels_count),
+        )
+        gl.glPointSize(point_size)
+        # Colors are written straight into the attribute buffer's system
+        # memory copy, going through `self.pixels.colors` would mark the
+        # whole list for upload.
+        self.colors_attribute = self.pixels.domain.attribute_names["colors"]
+        self.colors_offset = self.pixels.start * self.colors_attribute.stride
+        # Set when the window contents were lost (uncovered, resized).
+        self.needs_redraw = True
 
         self.window.event(self.on_draw)
+        self.window.push_handlers(on_expose=self.on_expose, on_resize=self.on_resize)
 
-    def on_draw(self):
-        for frame_pixel, display_pixel in zip(self.display.framebuffer, self.pixels):
-            display_pixel.color = frame_pixel.as_tuple()
+    def update(self, dt: float = 0) -> None:
+        # Only upload the ranges changed since the last update, and don't
+        # redraw at all when nothing changed.
+        dirty = self.display.take_dirty()
+        overlay_changed = self._update_overlay()
+        if not dirty and not overlay_changed and not self.needs_redraw:
+            return
+        self.needs_redraw = False
+
+        size = self.pixels_count * 3
+        for start, end in dirty:
+            end = min(end, size)
+            if start >= end:
+                continue
+            # Copy out of the framebuffer first, the server thread may swap
+            # buffers meanwhile.
+            chunk = bytes(self.display.framebuffer[start:end])
+            self._write_colors(start, chunk)
+
+        self.window.switch_to()
+        self.on_draw()
+        self.window.flip()
+        if dirty and self.metrics is not None:
+            self.metrics.on_draw()
+
+    def _write_colors(self, offset: int, data: bytes) -> None:
+        # The backing store and its pending upload bounds are the same on
+        # pyglet 2.0.7 `MappableBufferObject` and later
+        # `AttributeBufferObject`, unlike `set_data_region` which uploads
+        # directly on the latter. Only these bytes are uploaded on the next
+        # bind.
+        buffer = self.colors_attribute.buffer
+        start = self.colors_offset + offset
+        ctypes.memmove(buffer.data_ptr + start, data, len(data))
+        buffer._dirty_min = min(buffer._dirty_min, start)
+        buffer._dirty_max = max(buffer._dirty_max, start + len(data))
+
+    def _update_overlay(self) -> bool:
+        if self.overlay is None or self.metrics is None:
+            return False
+        text = self.metrics.summary()
+        if text == self.overlay.text:
+            return False
+        self.overlay.text = text
+        return True
 
+    def on_draw(self):
         self.window.clear()
         self.batch.draw()
 
-    def run(self):
-        pyglet.app.run()
+    def on_expose(self):
+        self.needs_redraw = True
+
+    def on_resize(self, width: int, height: int):
+        self.needs_redraw = True
+
+    def run(self, fps: float = 60):
+        frame = bytes(self.display.framebuffer[:self.pixels_count * 3])
+        self._write_colors(0, frame)
+        pyglet.clock.schedule_interval(self.update, 1 / fps)
+
+        # Redraws are driven by `update` only. The event loop schedules its
+        # own redraw of every window, on every pass when the interval is
+        # None, drop it once the loop started.
+        event_loop = pyglet.app.event_loop
+
+        @event_loop.event
+        def on_enter():
+            event_loop.clock.unschedule(event_loop._redraw_windows)
+
+        pyglet.app.run(None)
 
 
-def main(mapping_file: typer.FileText, port: int = 4048):
+def main(
+    mapping_file: typer.FileText,
+    port: int = 4048,
+    rcvbuf_size: t.Optional[int] = None,
+    source: Annotated[t.Optional[list[str]], typer.Option(
+        help="Sender host, one per output in led_config order.",
+    )] = None,
+    replay: Annotated[t.Optional[str], typer.Option(
+        help="Play a recording instead of listening for DDP.",
+    )] = None,
+    speed: float = 1.0,
+    metrics: Annotated[bool, typer.Option(
+        help="Show pipeline metrics on screen and log them periodically.",
+    )] = False,
+):
     mapping = Mapping.from_file(mapping_file)
-    server = DDPServer(host="0.0.0.0", port=port)
-    viewer = Viewer(mapping=mapping, display=server.display)
+    if replay:
+        return main_replay(mapping, replay, speed=speed)
+
+    display: t.Optional[Display] = None
+    if source:
+        display = MultiDisplay.from_led_config(
+            source,
+            mapping.led_config(len(source)),
+            key=SourceKey.ADDRESS,
+        )
+    server = DDPServer(
+        host="0.0.0.0",
+        port=port,
+        pixels_count=mapping.pixels_count,
+        rcvbuf_size=rcvbuf_size,
+        display=display,
+    )
+    viewer_metrics: t.Optional[Metrics] = None
+    reporter: t.Optional[MetricsReporter] = None
+    if metrics:
+        logging.basicConfig(level=logging.INFO)
+        viewer_metrics = Metrics()
+        server.enable_metrics(viewer_metrics)
+        reporter = MetricsReporter(viewer_metrics).start()
+    viewer = Viewer(mapping=mapping, display=server.display, metrics=viewer_metrics)
 
     server_thread = threading.Thread(target=server.serve_forever, daemon=True)
     server_thread.start()
     try:
         viewer.run()
     finally:
+        if reporter:
+            reporter.stop()
         server.shutdown()
         server_thread.join()
 
 
+def main_replay(mapping: Mapping, path: str, *, speed: float = 1.0):
+    reader = FrameReader.open(path)
+    display = VirtualDisplay(pixels_count=reader.pixels_count)
+    viewer = Viewer(mapping=mapping, display=display)
+
+    def play():
+        reader.play(lambda frame: display.show(bytes(frame)), speed=speed)
+
+    threading.Thread(target=play, daemon=True).start()
+    viewer.run()
+
+
 if __name__ == "__main__":
     typer.run(main)